@@ -61,8 +61,8 @@ def orgmodetable(matrix, header=False):
 
 
 import spacy
-from plasem_taln import inverse_document_frequencies
 from plasem_semeval import make_or_load_semeval_document_tree
+from plasem_semeval import make_or_load_inverse_document_frequencies, document_tokens
 from semeval_xml import get_semeval_content
 
 nlp = spacy.load('en')
@@ -76,18 +76,14 @@ doctrees = {
 }
 
 training_file = 'SemEval2016-Task3-CQA-QL-train-part1.xml'
-traindoctree = make_or_load_semeval_document_tree(
-    training_file,
-    'spacy_en_train2016p1_questions.pickle',
-    nlp,
-    get_semeval_content)
-
-inversedocfreqs = inverse_document_frequencies(
-    [[wordextractor(tok) for tok in doc]
-     for org in traindoctree.values()
-     for doc in org.values()]
-)
-outofcorpusvalue = max(inversedocfreqs.values())
+inversedocfreqs, outofcorpusvalue = make_or_load_inverse_document_frequencies(
+    (training_file,
+     'spacy_en_train2016p1_questions.pickle',
+     nlp,
+     get_semeval_content),
+    {'text_tokens': (wordextractor, document_tokens)},
+    'spacy_en_train2016p1'
+)['text_tokens']
 
 context = {'inversedocfreqs': inversedocfreqs,
            'outofcorpusvalue': outofcorpusvalue}
@@ -170,6 +166,7 @@ restable = []
 from plasem_semeval import sorted_scores_from_semeval_relevancy, write_scores_to_file, measure_generic, relevancy_dict_relevancy, sorted_scores_from_semeval_relevancy
 from plasem_algostruct import mean_average_precision, average_precision
 from plasem_taln import comparator, baseline_similarity, filters_baseline_similarity
+from plasem_batch import make_batch_score_tree, make_filtered_score_trees
 
 
 methodname = 'baseline_filters'
@@ -195,15 +192,18 @@ def avgtree(tree, relevfile):
 relevdict = { corpus : relevancy_dict_relevancy(relevancy[corpus])
               for corpus in corpora}
 
-for corpus, *rest in parameters:
-    context['filters'] = [filters[key] for key in rest[0]]
-
-    
-    compfilters = comparator(context, filters_baseline_similarity)
-    scores = make_score_tree(
+filtered_scores = {
+    corpus: make_filtered_score_trees(
         doctrees[corpus],
-        compfilters.getscore
+        comparator(context, filters_baseline_similarity),
+        filters,
+        filters_partition
     )
+    for corpus in corpora
+}
+
+for corpus, *rest in parameters:
+    scores = filtered_scores[corpus][rest[0]]
     predfile = getpredfilename(methodname, corpus, *rest)
     write_scores_to_file(scores, predfile)
     
@@ -240,9 +240,9 @@ baselinescores = {}
 for corpus in corpora:
     
     comp = comparator(context, baseline_similarity)
-    scores = make_score_tree(
+    scores = make_batch_score_tree(
         doctrees[corpus],
-        comp.getscore
+        comp
     )
     predfile = getpredfilename(methodname, corpus, *rest)
     write_scores_to_file(scores, predfile)
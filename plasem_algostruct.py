@@ -1,6 +1,10 @@
+import io
 import re
 import operator
 import pickle
+import hashlib
+import sqlite3
+from collections.abc import Mapping
 from statistics import mean
 
 def save_object(obj, filename):
@@ -9,6 +13,133 @@ def save_object(obj, filename):
 def load_object(filename):
     return pickle.load(open(filename, 'rb'))
 
+def file_digest(filename, chunk_size=1 << 20):
+    """Computes the SHA-1 hex digest of a file, reading it by chunks.
+
+    Parameters
+    ----------
+    filename : str
+        The file to hash.
+
+    chunk_size : int
+        The number of bytes read at once.
+
+    Returns
+    -------
+    out : str
+        The hex digest of the file content.
+    """
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def save_object_sqlite(tree, filename):
+    """Save a tree in a sqlite database, each node of its first level being pickled on its own.
+
+    The spaCy documents of the nodes are stored with Doc.to_bytes, without their vocabulary, which is saved once for the whole tree: pickling a document would copy its whole vocabulary into every node.
+    The tree can then be loaded lazily with sqlite_tree.
+
+    Parameters
+    ----------
+    tree : dict
+        The tree to save, its keys being strings or integers.
+
+    filename : str
+        The database file, its previous content is replaced.
+
+    Raises
+    ------
+    ValueError
+        If the documents of the tree do not share a single vocabulary.
+    """
+    try:
+        from spacy.tokens import Doc
+    except ImportError:  # then no node holds a document
+        Doc = None
+    vocabs = []
+
+    def persistent_id(obj):
+        if Doc is None or not isinstance(obj, Doc):
+            return None
+        if not vocabs:
+            vocabs.append(obj.vocab)
+        elif obj.vocab is not vocabs[0]:
+            raise ValueError('the documents of a tree saved with save_object_sqlite must share their vocabulary')
+        return obj.to_bytes()
+
+    def dumps(value):
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer)
+        pickler.persistent_id = persistent_id
+        pickler.dump(value)
+        return buffer.getvalue()
+
+    with sqlite3.connect(filename) as connection:
+        connection.execute('DROP TABLE IF EXISTS nodes')
+        connection.execute('DROP TABLE IF EXISTS vocab')
+        connection.execute(
+            'CREATE TABLE nodes (key PRIMARY KEY, position INTEGER, value BLOB)')
+        connection.execute('CREATE TABLE vocab (value BLOB)')
+        connection.executemany(
+            'INSERT INTO nodes VALUES (?, ?, ?)',
+            ((key, position, dumps(value))
+             for position, (key, value) in enumerate(tree.items())))
+        if vocabs:
+            connection.execute('INSERT INTO vocab VALUES (?)', (vocabs[0].to_bytes(),))
+    connection.close()
+
+class sqlite_tree(Mapping):
+    """Read-only tree saved by save_object_sqlite, loading each node of its first level on first access.
+
+    It behaves like the dict that was saved, so that inspecting or scoring a few original questions only unpickles those.
+    All the documents of the loaded nodes share one vocabulary.
+    """
+    def __init__(self, filename, vocab=None):
+        """
+        Parameters
+        ----------
+        filename : str
+            The database saved by save_object_sqlite.
+
+        vocab : spacy.vocab.Vocab
+            The vocabulary the documents are rebuilt against (ex the one of the model that made them), None to load the one saved with the tree when a document is first loaded.
+        """
+        self.connection = sqlite3.connect(filename)
+        self.vocab = vocab
+        self.nodes = {}
+
+    def load_document(self, data):
+        from spacy.tokens import Doc
+        if self.vocab is None:
+            from spacy.vocab import Vocab
+            row = self.connection.execute('SELECT value FROM vocab').fetchone()
+            self.vocab = Vocab().from_bytes(row[0])
+        return Doc(self.vocab).from_bytes(data)
+
+    def __getitem__(self, key):
+        if key not in self.nodes:
+            row = self.connection.execute(
+                'SELECT value FROM nodes WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            unpickler = pickle.Unpickler(io.BytesIO(row[0]))
+            unpickler.persistent_load = self.load_document
+            self.nodes[key] = unpickler.load()
+        return self.nodes[key]
+
+    def __contains__(self, key):
+        return key in self.nodes or self.connection.execute(
+            'SELECT 1 FROM nodes WHERE key = ?', (key,)).fetchone() is not None
+
+    def __iter__(self):
+        for row in self.connection.execute('SELECT key FROM nodes ORDER BY position'):
+            yield row[0]
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM nodes').fetchone()[0]
+
 def transformtree_deep(func, tree):
     """Transform a tree by applying a function to its leaves.
 
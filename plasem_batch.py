@@ -0,0 +1,518 @@
+from functools import partial
+import numpy as np
+from plasem_taln import INTERNED_BAGS, tf_idf_scorer, interned_tf_idf_scorer, interned_scorer_bag
+from plasem_taln import filters_baseline_similarity, filters_lemmas_similarity
+from plasem_taln import filters_baseline_units, filters_lemmas_units
+from plasem_taln import vocabulary, scorer, comparator
+
+
+class bag_matrix(object):
+    """Bags of words of documents stored as a CSR matrix of counts.
+
+    The terms of row i are indices[indptr[i]:indptr[i + 1]], in the insertion order of the bag, with their counts in data.
+    """
+    def __init__(self, indptr, indices, data):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        cumulated = np.concatenate(([0], np.cumsum(data)))
+        self.lengths = cumulated[indptr[1:]] - cumulated[indptr[:-1]]
+
+
+def expand_rows(indptr, rows):
+    """Enumerate the entries of a sequence of rows of a CSR matrix.
+
+    Parameters
+    ----------
+    indptr : numpy.ndarray
+        The entries of row i being indptr[i]:indptr[i + 1].
+
+    rows : numpy.ndarray
+        The rows, one per pair of documents.
+
+    Returns
+    -------
+    out : tuple(numpy.ndarray, numpy.ndarray)
+        For each entry of the rows in order, the index of its row in rows and the index of the entry.
+    """
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    firsts = np.cumsum(lengths) - lengths
+    pairs = np.repeat(np.arange(len(rows)), lengths)
+    entries = np.arange(lengths.sum()) + np.repeat(starts - firsts, lengths)
+    return pairs, entries
+
+
+def shared_terms(refptr, refterms, canptr, canterms, pair_references, pair_candidates, width):
+    """Match the terms of the references and of the candidates of pairs of documents.
+
+    Parameters
+    ----------
+    refptr, canptr : numpy.ndarray
+        The entries of the row i being refptr[i]:refptr[i + 1] (resp. canptr).
+
+    refterms, canterms : numpy.ndarray
+        The term of each entry, unique in its row.
+
+    pair_references, pair_candidates : numpy.ndarray
+        The rows of the reference and of the candidate of each pair.
+
+    width : int
+        Number of terms.
+
+    Returns
+    -------
+    out : tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        For each term shared by a pair, ordered by pair then by the position of the term in the reference, the pair and the entries of the reference and of the candidate.
+    """
+    refpairs, refentries = expand_rows(refptr, pair_references)
+    canpairs, canentries = expand_rows(canptr, pair_candidates)
+    width = max(width, 1)
+    _, refshared, canshared = np.intersect1d(
+        refpairs * width + refterms[refentries],
+        canpairs * width + canterms[canentries],
+        assume_unique=True, return_indices=True)
+    order = np.argsort(refshared, kind='stable')  # back to the order of the references
+    refshared = refshared[order]
+    return refpairs[refshared], refentries[refshared], canentries[canshared[order]]
+
+
+def tf_idf_values(occurrences, documentlens, inversedocfreqs, outofcorpusvalue):
+    """TF-IDF values of terms, as computed by tf_idf, NaN inverse document frequencies standing for out of corpus terms."""
+    return np.where(np.isnan(inversedocfreqs), outofcorpusvalue,
+                    occurrences / documentlens * inversedocfreqs)
+
+
+def make_bag_matrix(bags):
+    """Vectorize bags of term ids, each term id being a column.
+
+    Parameters
+    ----------
+    bags : list of Counter
+        One bag per row.
+
+    Returns
+    -------
+    out : bag_matrix
+    """
+    indices = []
+    data = []
+    indptr = np.zeros(len(bags) + 1, dtype=np.int64)
+    for row, bag in enumerate(bags):
+        indices.extend(bag.keys())
+        data.extend(bag.values())
+        indptr[row + 1] = len(indices)
+    return bag_matrix(indptr, np.array(indices, dtype=np.int64), np.array(data, dtype=np.int64))
+
+
+def idf_vector(vocabulary, inversedocfreqs):
+    """Inverse document frequencies of all the term ids of a vocabulary, NaN standing for out of corpus terms.
+
+    Parameters
+    ----------
+    vocabulary : vocabulary
+
+    inversedocfreqs : interned_idf
+        The inverse document frequencies, interned in the vocabulary.
+    """
+    values = np.full(len(vocabulary), np.nan)
+    known = np.asarray(inversedocfreqs.values)[:len(vocabulary)]
+    values[:len(known)] = known
+    return values
+
+
+def pair_tf_idf(references, candidates, pair_references, pair_candidates,
+                inversedocfreqs, outofcorpusvalue):
+    """TF-IDF values of the shared terms of pairs of documents, as summed by generic_similarity.
+
+    The term frequencies are normalised by the length of the two bags of the pair, and out of corpus terms are given outofcorpusvalue.
+
+    Parameters
+    ----------
+    references : bag_matrix
+
+    candidates : bag_matrix
+        Bags compared to the references, interned in the same vocabulary.
+
+    pair_references : numpy.ndarray
+
+    pair_candidates : numpy.ndarray
+        The rows of the reference and of the candidate of each pair.
+
+    inversedocfreqs : numpy.ndarray
+        Inverse document frequency of each term id (see idf_vector).
+
+    Returns
+    -------
+    out : tuple(numpy.ndarray, numpy.ndarray)
+        The pair of each shared term and its TF-IDF value, in the order of the pairs then of the reference bags.
+    """
+    pairs, refshared, canshared = shared_terms(
+        references.indptr, references.indices, candidates.indptr, candidates.indices,
+        pair_references, pair_candidates, len(inversedocfreqs))
+    occurrences = references.data[refshared] + candidates.data[canshared]
+    documentlens = (references.lengths[pair_references]
+                    + candidates.lengths[pair_candidates])
+    return pairs, tf_idf_values(occurrences, documentlens[pairs],
+                                inversedocfreqs[references.indices[refshared]],
+                                outofcorpusvalue)
+
+
+def sum_by_pair(pairs, values, npairs):
+    """Sum values pair by pair in their order, as the builtin sum does, pairs without any value scoring 0."""
+    scores = np.bincount(pairs, weights=values, minlength=npairs).tolist()
+    shared = np.bincount(pairs, minlength=npairs)
+    return [score if count else 0 for score, count in zip(scores, shared)]
+
+
+def batch_score_tree(document_tree, context, bagmaker, intersection_weighted=False):
+    """Score all the pairs of original and related questions of a document tree at once, with TF-IDF over bags of term ids.
+
+    Every document is bagged once, the pairs being then compared with NumPy operations.
+    The scores are the same as the ones of interned_generic_similarity, or of interned_tf_idf_scorer when intersection_weighted, the original question being the reference.
+
+    Parameters
+    ----------
+    document_tree : dict of dict of document
+        Tree of the documents, as built by make_semeval_document_tree.
+
+    context : scorer or comparator
+        Holds the vocabulary, the interned inverse document frequencies and the out of corpus value.
+
+    bagmaker : function(context, document)
+        Function making the bag of term ids of a document (ex interned_scorer_bag).
+
+    intersection_weighted : bool
+        Multiply the TF-IDF value of each shared term by the number of shared terms, as tf_idf_scorer does.
+
+    Returns
+    -------
+    out : dict of dict of float
+        The score tree, as computed by make_score_tree.
+    """
+    pairs = tree_pairs(document_tree)
+    orgs = make_bag_matrix([bagmaker(context, doc) for doc in pairs.orgdocs])
+    rels = make_bag_matrix([bagmaker(context, doc) for doc in pairs.reldocs])
+    return pairs.score_tree(orgs, rels, idf_vector(context.vocabulary, context.interned_idf),
+                            context.outofcorpusvalue, intersection_weighted)
+
+
+class tree_pairs(object):
+    """Pairs of original and related questions of a document tree, each document being a row of the matrices that will be compared."""
+    def __init__(self, document_tree):
+        self.document_tree = document_tree
+        self.ids = []
+        orgrows = []
+        relrows = []
+        self.orgdocs = []
+        self.reldocs = []
+        for orgid, orgqnode in document_tree.items():
+            self.orgdocs.append(orgqnode['org'])
+            for relid, doc in orgqnode.items():
+                if relid != 'org':
+                    self.ids.append((orgid, relid))
+                    orgrows.append(len(self.orgdocs) - 1)
+                    relrows.append(len(self.reldocs))
+                    self.reldocs.append(doc)
+        self.orgrows = np.array(orgrows, dtype=np.int64)
+        self.relrows = np.array(relrows, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def score_tree(self, orgs, rels, inversedocfreqs, outofcorpusvalue, intersection_weighted=False):
+        """Score the pairs from the bags of their documents.
+
+        Parameters
+        ----------
+        orgs : bag_matrix
+            Bags of the original questions.
+
+        rels : bag_matrix
+            Bags of the related questions.
+
+        inversedocfreqs : numpy.ndarray
+            Inverse document frequency of each term id (see idf_vector).
+
+        Returns
+        -------
+        out : dict of dict of float
+            The score tree.
+        """
+        shared, values = pair_tf_idf(orgs, rels, self.orgrows, self.relrows,
+                                     inversedocfreqs, outofcorpusvalue)
+        return self.score_tree_from_terms(shared, values, intersection_weighted)
+
+    def score_tree_from_terms(self, shared, values, intersection_weighted=False):
+        """Sum the TF-IDF values of the terms shared by the pairs into a score tree.
+
+        Parameters
+        ----------
+        shared : numpy.ndarray
+            The pair of each shared term, ordered by pair then by the position of the term in the bag of the original question.
+
+        values : numpy.ndarray
+            The TF-IDF value of each shared term.
+
+        Returns
+        -------
+        out : dict of dict of float
+            The score tree.
+        """
+        if intersection_weighted:
+            values = values * np.bincount(shared, minlength=len(self))[shared]
+
+        scores = {orgid: {} for orgid in self.document_tree.keys()}
+        for (orgid, relid), score in zip(self.ids, sum_by_pair(shared, values, len(self))):
+            scores[orgid][relid] = score
+        return scores
+
+
+def make_batch_score_tree(document_tree, comp):
+    """Drop-in replacement of make_score_tree(document_tree, comp.getscore) scoring all the pairs at once.
+
+    Only the similarity functions of INTERNED_BAGS (baseline_similarity, filters_baseline_similarity and filters_lemmas_similarity) are vectorized, the other ones are computed pair by pair.
+    The documents are bagged in the vocabulary of the comparator, or in a vocabulary of their own if it has none.
+
+    Parameters
+    ----------
+    document_tree : dict of dict of document
+
+    comp : comparator
+        The comparator whose scores are computed.
+
+    Returns
+    -------
+    out : dict of dict of float
+        The score tree.
+    """
+    bagmaker = INTERNED_BAGS.get(comp.similarity)
+    if bagmaker is None:
+        return {orgid: {relid: comp.getscore(orgqnode['org'], doc)
+                        for relid, doc in orgqnode.items() if relid != 'org'}
+                for orgid, orgqnode in document_tree.items()}
+    if comp.vocabulary is None:
+        comp = comparator(dict(comp, vocabulary=vocabulary()), comp.similarity)
+    return batch_score_tree(document_tree, comp, bagmaker)
+
+
+def make_batch_scorer_tree(document_tree, customscorer):
+    """Drop-in replacement of make_score_tree(document_tree, customscorer.get_score) scoring all the pairs at once.
+
+    Only tf_idf_scorer and interned_tf_idf_scorer are vectorized, with any word extractor, sentence extractor and filters of the scorer (ex the entities of the documents and their labels), the other scorer functions being computed pair by pair.
+    The documents are bagged in the vocabulary of the scorer, or in a vocabulary of their own if it has none.
+
+    Parameters
+    ----------
+    document_tree : dict of dict of document
+
+    customscorer : scorer
+        The scorer whose scores are computed.
+
+    Returns
+    -------
+    out : dict of dict of float
+        The score tree.
+    """
+    if customscorer.scorerfunction not in (tf_idf_scorer, interned_tf_idf_scorer):
+        return {orgid: {relid: customscorer.get_score(orgqnode['org'], doc)
+                        for relid, doc in orgqnode.items() if relid != 'org'}
+                for orgid, orgqnode in document_tree.items()}
+    if customscorer.vocabulary is None:
+        customscorer = scorer(customscorer.wordex, customscorer.sentex, customscorer.filters,
+                              customscorer.inversedocfreqs, customscorer.outofcorpusvalue,
+                              interned_tf_idf_scorer, vocabulary())
+    return batch_score_tree(document_tree, customscorer, interned_scorer_bag,
+                            intersection_weighted=True)
+
+
+####################
+# compiled filters #
+####################
+"""Unit makers of the similarity functions whose filters can be compiled."""
+SIMILARITY_UNITS = {
+    filters_baseline_similarity: filters_baseline_units,
+    filters_lemmas_similarity: filters_lemmas_units,
+}
+
+
+class unit_matrix(object):
+    """Unfiltered units of documents, each unit being a surface form id, on which the filters are evaluated, and the term id that is counted.
+
+    The units of document i are surfaces[indptr[i]:indptr[i + 1]] and terms[indptr[i]:indptr[i + 1]], in the order of the document.
+    """
+    def __init__(self, documents, unitmaker):
+        """
+        Parameters
+        ----------
+        documents : list of document
+
+        unitmaker : function(document)
+            Function making the term ids and the surface form ids of the units of a document (ex filters_baseline_units), interned in the vocabulary shared by the matrices that will be compared.
+        """
+        surfaces = []
+        termids = []
+        self.indptr = np.zeros(len(documents) + 1, dtype=np.int64)
+        for row, doc in enumerate(documents):
+            units = unitmaker(doc)
+            termids.extend(units[0])
+            surfaces.extend(units[1])
+            self.indptr[row + 1] = len(surfaces)
+        self.surfaces = np.array(surfaces, dtype=np.int64)
+        self.terms = np.array(termids, dtype=np.int64)
+        self.rows = np.repeat(np.arange(len(documents)), np.diff(self.indptr))
+
+        # groups of the units of a same document and term, ordered by document then term
+        self.order = np.lexsort((self.terms, self.rows))
+        rows = self.rows[self.order]
+        terms = self.terms[self.order]
+        changes = np.flatnonzero((np.diff(rows) != 0) | (np.diff(terms) != 0)) + 1
+        self.groupstarts = np.concatenate(([0], changes)) if len(self.order) else changes
+        self.groupterms = terms[self.groupstarts]
+        self.groupptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(rows[self.groupstarts], minlength=len(documents)))))
+
+    def filtered_groups(self, kept):
+        """Apply filters to the groups of units of a same document and term.
+
+        Parameters
+        ----------
+        kept : numpy.ndarray of bool
+            Result of the filters for each surface form id (see unit_tree.keep).
+
+        Returns
+        -------
+        out : tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray)
+            For each group, the number of kept units and the position of the first one (len(self.terms) if there is none), and the number of kept units of each document.
+        """
+        keptunits = kept[self.surfaces]
+        lengths = np.bincount(self.rows, weights=keptunits, minlength=len(self.indptr) - 1)
+        if not len(self.order):
+            return self.groupterms, self.groupterms, lengths.astype(np.int64)
+        keptunits = keptunits[self.order]
+        counts = np.add.reduceat(keptunits.astype(np.int64), self.groupstarts)
+        firsts = np.minimum.reduceat(np.where(keptunits, self.order, len(self.order)),
+                                     self.groupstarts)
+        return counts, firsts, lengths.astype(np.int64)
+
+
+class unit_tree(tree_pairs):
+    """Pairs of a document tree whose units are extracted once, to be scored with any combination of filters compiled in a vocabulary."""
+    def __init__(self, document_tree, unitmaker, vocabulary, filters):
+        """
+        Parameters
+        ----------
+        document_tree : dict of dict of document
+
+        unitmaker : function(document)
+            Function making the term ids and the surface form ids of the units of a document (ex a partial application of extractor_units).
+
+        vocabulary : vocabulary
+            Vocabulary in which the unit maker interns the units, and in which the filters are compiled.
+
+        filters : dict
+            Filters by name, as the filters dictionary of semeval_executable.py (at most 64 filters).
+        """
+        super().__init__(document_tree)
+        self.vocabulary = vocabulary
+        self.filters = filters
+        self.orgunits = unit_matrix(self.orgdocs, unitmaker)
+        self.relunits = unit_matrix(self.reldocs, unitmaker)
+        self.shared = shared_terms(
+            self.orgunits.groupptr, self.orgunits.groupterms,
+            self.relunits.groupptr, self.relunits.groupterms,
+            self.orgrows, self.relrows, len(self.vocabulary))
+
+    def keep(self, combination):
+        """Results of a combination of filters for each term id of the vocabulary.
+
+        Parameters
+        ----------
+        combination : iterable of str
+            Names of filters (ex an entry of filters_partition).
+
+        Returns
+        -------
+        out : numpy.ndarray of bool
+            True for the term ids passing all the filters of the combination.
+        """
+        mask = np.uint64(self.vocabulary.filter_mask(self.filters[name] for name in combination))
+        bitmasks = np.array(self.vocabulary.compile(), dtype=np.uint64)
+        return (bitmasks & mask) == mask
+
+    def filtered_score_trees(self, combinations, inversedocfreqs, outofcorpusvalue,
+                             intersection_weighted=False):
+        """Score the pairs with several combinations of filters, the terms of the pairs being matched once for all of them.
+
+        The terms shared by a pair with a combination of filters are the terms shared without filters that keep at least one unit on both sides, their counts, the lengths of the bags and the order of the terms being derived from the units kept by the combination.
+
+        Parameters
+        ----------
+        combinations : iterable of tuple of str
+            The combinations of names of filters (ex filters_partition).
+
+        inversedocfreqs : interned_idf
+            The inverse document frequencies of the corpus, interned in the vocabulary.
+
+        intersection_weighted : bool
+            Multiply the TF-IDF value of each shared term by the number of shared terms, as tf_idf_scorer does.
+
+        Returns
+        -------
+        out : dict of dict of dict of float
+            The score tree of each combination, the same as the one of the pairwise similarity with its filters.
+        """
+        pairs, orggroups, relgroups = self.shared
+        idf = idf_vector(self.vocabulary, inversedocfreqs)[self.orgunits.groupterms[orggroups]]
+        score_trees = {}
+        for combination in combinations:
+            kept = self.keep(combination)
+            orgcounts, orgfirsts, orglengths = self.orgunits.filtered_groups(kept)
+            relcounts, _, rellengths = self.relunits.filtered_groups(kept)
+            shared = np.flatnonzero((orgcounts[orggroups] > 0) & (relcounts[relgroups] > 0))
+            shared = shared[np.lexsort((orgfirsts[orggroups[shared]], pairs[shared]))]
+
+            occurrences = orgcounts[orggroups[shared]] + relcounts[relgroups[shared]]
+            documentlens = orglengths[self.orgrows] + rellengths[self.relrows]
+            values = tf_idf_values(occurrences, documentlens[pairs[shared]], idf[shared],
+                                   outofcorpusvalue)
+            score_trees[tuple(combination)] = self.score_tree_from_terms(
+                pairs[shared], values, intersection_weighted)
+        return score_trees
+
+    def filtered_score_tree(self, combination, inversedocfreqs, outofcorpusvalue,
+                            intersection_weighted=False):
+        """Score the pairs keeping only the units that pass a combination of filters (see filtered_score_trees)."""
+        return self.filtered_score_trees([combination], inversedocfreqs, outofcorpusvalue,
+                                         intersection_weighted)[tuple(combination)]
+
+
+def make_filtered_score_trees(document_tree, comp, filters, combinations):
+    """Score trees of a comparator for several combinations of filters, computed in one pass.
+
+    Parameters
+    ----------
+    document_tree : dict of dict of document
+
+    comp : comparator
+        Comparator using a similarity function of SIMILARITY_UNITS, its own filters being ignored.
+        The documents are interned in its vocabulary, or in a vocabulary of their own if it has none.
+
+    filters : dict
+        Filters by name.
+
+    combinations : iterable of tuple of str
+        The combinations of names of filters (ex filters_partition).
+
+    Returns
+    -------
+    out : dict of dict of dict of float
+        The score tree of each combination, the same as make_score_tree(document_tree, comp.getscore) with the filters of the combination.
+    """
+    unitmaker = SIMILARITY_UNITS.get(comp.similarity)
+    if unitmaker is None:
+        raise ValueError('the filters of %s cannot be compiled' % getattr(comp.similarity, '__name__', comp.similarity))
+    if comp.vocabulary is None:
+        comp = comparator(dict(comp, vocabulary=vocabulary()), comp.similarity)
+    units = unit_tree(document_tree, partial(unitmaker, comp), comp.vocabulary, filters)
+    return units.filtered_score_trees(combinations, comp.interned_idf, comp.outofcorpusvalue)
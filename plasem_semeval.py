@@ -1,47 +1,658 @@
 from operator import itemgetter
+from functools import partial
+from itertools import islice
 import csv
+import hashlib
+import json
+import os
 import os.path
-from plasem_algostruct import save_object, load_object, natural_sort_key
-from semeval_xml import get_semeval_id, get_related_threads, xmlextract, is_relevant_to_orgq
+import sys
+import warnings
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from plasem_algostruct import save_object, load_object, natural_sort_key, file_digest
+from plasem_taln import entity_weighter, noun_weighter, adjective_weighter, verb_weighter
+from plasem_taln import sharded_document_frequencies, inverse_document_frequencies
+from semeval_xml import get_semeval_id, get_related_threads, iterparse_org_questions, corpusextract, pack_semeval_id, unpack_semeval_id, scan_relevancy
 
-def make_semeval_document_tree(original_questions, model, content_extractor):
+def semeval_sort_key(identifier):
+    """Sort key of string or packed ids, packed ids being sorted natively."""
+    return identifier if isinstance(identifier, int) else natural_sort_key(identifier)
+
+def semeval_id_str(identifier):
+    """String form of a string or packed id."""
+    return unpack_semeval_id(identifier) if isinstance(identifier, int) else identifier
+
+def has_packed_ids(tree):
+    """Check whether a document or score tree is keyed by packed ids."""
+    return isinstance(next(iter(tree), None), int)
+
+def annotate(model, texts_with_contexts, batch_size=None, n_process=1):
+    """Annotate texts in batches, keeping each text's context alongside its document.
+
+    Parameters
+    ----------
+    model : spacy.language.Language or function
+        The model used to annotate the texts.
+        Models without a pipe method are called on each text.
+
+    texts_with_contexts : iterable of tuple(str, object)
+        The texts to annotate, with their (picklable) contexts.
+
+    batch_size : int
+        The number of texts per batch, spaCy's default if None.
+
+    n_process : int
+        The number of processes annotating the batches.
+
+    Returns
+    -------
+    out : generator of tuple(Doc, object)
+        The documents with their contexts, in the order of the texts.
+    """
+    if not hasattr(model, 'pipe'):
+        return ((model(text), context) for text, context in texts_with_contexts)
+
+    options = {}
+    if batch_size is not None:
+        options['batch_size'] = batch_size
+    if n_process != 1:
+        options['n_process'] = n_process
+    return model.pipe(texts_with_contexts, as_tuples=True, **options)
+
+def make_semeval_document_tree(original_questions, model, content_extractor, packed_ids=False,
+                               batch_size=None, n_process=1):
     result = {}
-    for org in original_questions:
-        orgid = get_semeval_id(org)
-        result[orgid] = {
-            get_semeval_id(rel): model(content_extractor(rel))
-            for rel in get_related_threads(org)
-        }
-        result[orgid]['org'] = model(content_extractor(org))
+
+    def contents():
+        for org in original_questions:
+            orgid = get_semeval_id(org, packed_ids)
+            # setdefault allows original questions to be spread over several elements
+            result.setdefault(orgid, {})
+            for rel in get_related_threads(org):
+                yield content_extractor(rel), (orgid, get_semeval_id(rel, packed_ids))
+            yield content_extractor(org), (orgid, 'org')
+
+    for doc, (orgid, key) in annotate(model, contents(), batch_size, n_process):
+        result[orgid][key] = doc
     return result
 
-def make_or_load_semeval_document_tree(xml_source, saved_path, model, content_extractor, verbose=False):
-    if os.path.isfile(saved_path):
+def text_digest(text):
+    return hashlib.sha1((text or '').encode('utf-8')).hexdigest()
+
+class annotation_memo(object):
+    """Model wrapper annotating each distinct text only once.
+
+    The documents are memoized by the hash of their text and the enabled pipeline, so a text repeated across original questions or across corpora goes through the model once and its document is shared by reference.
+    The wrapper can be given anywhere a model is expected, the attributes it does not define being those of the model.
+    """
+
+    def __init__(self, model, chunk_size=10000):
+        """
+        Parameters
+        ----------
+        model : spacy.language.Language or function
+            The model to memoize.
+
+        chunk_size : int
+            The number of texts read at once by pipe, in which the new texts are looked for.
+        """
+        self.model = model
+        self.chunk_size = chunk_size
+        self.docs = {}
+        self.calls = 0
+        self.saved = 0
+
+    def __getattr__(self, name):
+        if name == 'model' or name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def memo_key(self, text):
+        return text_digest(text), tuple(getattr(self.model, 'pipe_names', ()))
+
+    def __call__(self, text):
+        key = self.memo_key(text)
+        if key in self.docs:
+            self.saved += 1
+        else:
+            self.docs[key] = self.model(text)
+            self.calls += 1
+        return self.docs[key]
+
+    def pipe(self, texts, as_tuples=False, **options):
+        """Annotate a stream of texts like the pipe method of a spaCy model, the new texts being annotated in batches."""
+        items = iter(texts)
+        while True:
+            chunk = list(islice(items, self.chunk_size))
+            if not chunk:
+                return
+            keys = [self.memo_key(item[0] if as_tuples else item) for item in chunk]
+
+            new_texts = {}
+            for key, item in zip(keys, chunk):
+                if key not in self.docs and key not in new_texts:
+                    new_texts[key] = item[0] if as_tuples else item
+            self.saved += len(chunk) - len(new_texts)
+            self.calls += len(new_texts)
+            for key, doc in zip(new_texts, annotate(
+                    self.model, ((text, None) for text in new_texts.values()), **options)):
+                self.docs[key] = doc[0]
+
+            for key, item in zip(keys, chunk):
+                yield (self.docs[key], item[1]) if as_tuples else self.docs[key]
+
+    def report(self):
+        """Describe how many model calls the memo saved."""
+        total = self.calls + self.saved
+        return '%d texts, %d model calls, %d saved (%.1f%%)' % (
+            total, self.calls, self.saved, 100 * self.saved / total if total else 0)
+
+def update_semeval_document_tree(original_questions, model, content_extractor,
+                                 document_tree, content_hashes, packed_ids=False,
+                                 batch_size=None, n_process=1):
+    """Make a document tree, reusing the documents of a previous tree whose content did not change.
+
+    Only the new or changed documents are annotated, whereas the documents that are not in the original questions anymore are left out.
+
+    Parameters
+    ----------
+    original_questions : iterable of ET.Element
+        The original questions of the updated corpus.
+
+    document_tree : dict of dict of Doc
+        The previous document tree.
+
+    content_hashes : dict of dict of str
+        The hashes of the contents of the previous tree, with the same layout.
+
+    The other parameters are those of make_semeval_document_tree.
+
+    Returns
+    -------
+    out : tuple(dict of dict of Doc, dict of dict of str, int)
+        The updated document tree, the hashes of its contents and the number of annotated documents.
+    """
+    result = {}
+    hashes = {}
+
+    def contents():
+        for org in original_questions:
+            orgid = get_semeval_id(org, packed_ids)
+            result.setdefault(orgid, {})
+            hashes.setdefault(orgid, {})
+            previous_docs = document_tree.get(orgid, {})
+            previous_hashes = content_hashes.get(orgid, {})
+            elements = [(get_semeval_id(rel, packed_ids), rel) for rel in get_related_threads(org)]
+            elements.append(('org', org))
+            for key, element in elements:
+                text = content_extractor(element)
+                hashes[orgid][key] = text_digest(text)
+                if key in previous_docs and previous_hashes.get(key) == hashes[orgid][key]:
+                    result[orgid][key] = previous_docs[key]
+                else:
+                    result[orgid][key] = None  # keeps the document order
+                    yield text, (orgid, key)
+
+    annotated = 0
+    for doc, (orgid, key) in annotate(model, contents(), batch_size, n_process):
+        result[orgid][key] = doc
+        annotated += 1
+    return result, hashes, annotated
+
+"""Pipeline components needed to compute each token attribute.
+
+The keys are the names of the word extractors ('text', 'lemma', 'label') and of the sentence extractors ('document', 'entities') used in the indicators, as well as 'pos' for the part of speech.
+Both spaCy 2 (tagger, parser, ner) and spaCy 3 (tok2vec, tagger, attribute_ruler, lemmatizer, parser, ner) component names are listed, the missing ones being ignored.
+"""
+PIPELINE_REQUIREMENTS = {
+    'text': set(),
+    'document': set(),
+    'lemma': {'tok2vec', 'tagger', 'attribute_ruler', 'lemmatizer'},
+    'pos': {'tok2vec', 'tagger', 'attribute_ruler'},
+    'label': {'tok2vec', 'ner'},
+    'entities': {'tok2vec', 'ner'},
+}
+
+WEIGHTER_REQUIREMENTS = {
+    entity_weighter: 'entities',
+    noun_weighter: 'pos',
+    adjective_weighter: 'pos',
+    verb_weighter: 'pos',
+}
+
+def plan_pipeline(model, indicators, weighters=()):
+    """Determine the pipeline components that are not needed by a set of experiments.
+
+    Parameters
+    ----------
+    model : spacy.language.Language
+        The model whose pipeline is planned.
+
+    indicators : iterable of tuple(str, str)
+        The indicators (word extractor name, sentence extractor name) that will be computed, as in all_indicators.
+
+    weighters : iterable of function
+        The weighters that will be used (the functions of the weights given to generic_weights_scorer).
+
+    Returns
+    -------
+    out : list of str
+        The names of the components that can be disabled, none if an indicator or a weighter is unknown.
+    """
+    required = set()
+    attributes = [name for indicator in indicators for name in indicator]
+    attributes.extend(WEIGHTER_REQUIREMENTS.get(weighter) for weighter in weighters)
+    for attribute in attributes:
+        if attribute not in PIPELINE_REQUIREMENTS:
+            return []
+        required |= PIPELINE_REQUIREMENTS[attribute]
+    return [name for name in model.pipe_names if name not in required]
+
+def planned_tree_path(saved_path, disable=()):
+    """Name the file saved with a planned pipeline, so that the files of different plans do not overwrite one another.
+
+    Parameters
+    ----------
+    saved_path : str
+        The file saved with the whole pipeline (ex a document tree or the prefix of inverse document frequency tables).
+
+    disable : iterable of str
+        The pipeline components that will be disabled, as returned by plan_pipeline.
+
+    Returns
+    -------
+    out : str
+        saved_path itself if nothing is disabled, otherwise saved_path with the disabled components before its extension.
+    """
+    if not disable:
+        return saved_path
+    root, extension = os.path.splitext(saved_path)
+    return root + '_no_' + '_'.join(sorted(disable)) + extension
+
+def disabled_pipes(model, disable):
+    """Context manager disabling pipeline components, with either spaCy 2 or spaCy 3."""
+    if not disable:
+        return nullcontext()
+    if hasattr(model, 'select_pipes'):
+        return model.select_pipes(disable=list(disable))
+    return model.disable_pipes(*disable)
+
+def stable_repr(value):
+    """repr of a value for cache keys, listing the elements of sets in a sorted order.
+
+    The order of the elements of a set depends on the hash seed of the strings (PYTHONHASHSEED), which changes from one run to another.
+    """
+    if isinstance(value, (set, frozenset)):
+        return type(value).__name__ + '({' + ', '.join(sorted(map(stable_repr, value))) + '})'
+    if isinstance(value, (tuple, list)):
+        return type(value).__name__ + '(' + ', '.join(map(stable_repr, value)) + ')'
+    if isinstance(value, dict):
+        return 'dict(' + ', '.join(sorted(stable_repr(key) + ': ' + stable_repr(item)
+                                          for key, item in value.items())) + ')'
+    return repr(value)
+
+def callable_identity(function):
+    """Describe a function (or a partial application of a function) for cache keys."""
+    if isinstance(function, partial):
+        return [callable_identity(function.func), stable_repr(function.args),
+                stable_repr(function.keywords)]
+    function = getattr(function, '__func__', function)  # bound methods
+    return [getattr(function, '__module__', None),
+            getattr(function, '__qualname__', type(function).__qualname__)]
+
+def model_identity(model, disable=()):
+    """Describe a model and its enabled pipeline for cache keys.
+
+    Parameters
+    ----------
+    model : spacy.language.Language or function
+        The model to describe.
+
+    disable : iterable of str
+        The pipeline components that will be disabled.
+
+    Returns
+    -------
+    out : dict
+        The name, version and pipeline of a spaCy model, along with the version of spaCy, or the identity of any other callable.
+    """
+    meta = getattr(model, 'meta', None)
+    if not isinstance(meta, dict):
+        return {'callable': callable_identity(model)}
+    return {
+        'lang': meta.get('lang'),
+        'name': meta.get('name'),
+        'version': meta.get('version'),
+        'spacy': getattr(sys.modules.get('spacy'), '__version__', None),
+        'pipeline': [name for name in getattr(model, 'pipe_names', [])
+                     if name not in disable],
+    }
+
+def xml_source_digest(xml_source, saved_path=None):
+    """Digest of the XML input of a document tree, reusing the one saved next to the tree while the size and modification time of the input are unchanged.
+
+    Parameters
+    ----------
+    xml_source : str
+        The XML input.
+
+    saved_path : str
+        The saved document tree, None not to reuse any saved digest.
+
+    Returns
+    -------
+    out : tuple(str, list)
+        The digest and the [size, modification time] of the input, the latter being None if the input is missing and the saved digest was used instead.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the input is missing and there is no saved tree to fall back to.
+    """
+    saved = {}
+    if saved_path is not None and os.path.isfile(saved_path) \
+       and os.path.isfile(document_tree_metadata_path(saved_path)):
+        saved = load_object(document_tree_metadata_path(saved_path))
+    try:
+        stat = os.stat(xml_source)
+    except FileNotFoundError:
+        if 'xml_digest' not in saved:
+            raise
+        warnings.warn(xml_source + ' is missing, using the document tree saved in ' + saved_path)
+        return saved['xml_digest'], None
+    xml_stat = [stat.st_size, stat.st_mtime_ns]
+    if 'xml_digest' in saved and saved.get('xml_stat') == xml_stat:
+        return saved['xml_digest'], xml_stat
+    return file_digest(xml_source), xml_stat
+
+def document_tree_metadata(xml_source, model, content_extractor, packed_ids=False, disable=(), saved_path=None):
+    """Describe everything a document tree depends on.
+
+    The XML input is only hashed when there is no saved tree, or when its size or modification time changed since the tree was saved (see xml_source_digest).
+
+    Returns
+    -------
+    out : dict
+        The metadata, its 'key' entry being the hash of all the others but 'xml_stat', its 'build_key' entry the hash of all the others but the XML input, and its 'xml_stat' entry the size and modification time of the input.
+    """
+    xml_digest, xml_stat = xml_source_digest(xml_source, saved_path)
+    metadata = {
+        'xml_digest': xml_digest,
+        'model': model_identity(model, disable),
+        'extractor': callable_identity(content_extractor),
+        'packed_ids': packed_ids,
+    }
+    metadata['key'] = hashlib.sha1(
+        json.dumps(metadata, sort_keys=True).encode('utf-8')).hexdigest()
+    # everything but the input, for incremental updates
+    metadata['build_key'] = hashlib.sha1(json.dumps(
+        [metadata['model'], metadata['extractor'], packed_ids], sort_keys=True
+    ).encode('utf-8')).hexdigest()
+    # the input might be touched without being changed, so it is not part of the keys
+    metadata['xml_stat'] = xml_stat
+    return metadata
+
+def document_tree_metadata_path(saved_path):
+    return saved_path + '.meta'
+
+def is_document_tree_cached(xml_source, saved_path, model, content_extractor, packed_ids=False, disable=()):
+    """Check whether a saved document tree was built from the same XML, model and extractor.
+
+    The metadata of a tree is saved next to it by make_or_load_semeval_document_tree.
+    """
+    return saved_metadata_matches(
+        saved_path,
+        document_tree_metadata(xml_source, model, content_extractor, packed_ids, disable, saved_path))
+
+def saved_metadata_matches(saved_path, metadata, key='key'):
+    metadata_path = document_tree_metadata_path(saved_path)
+    return os.path.isfile(saved_path) and os.path.isfile(metadata_path) \
+        and load_object(metadata_path).get(key) == metadata[key]
+
+def make_or_load_semeval_document_tree(xml_source, saved_path, model, content_extractor, verbose=False, packed_ids=False,
+                                       batch_size=None, n_process=1, disable=(), incremental=False):
+    """Load a saved document tree, or make and save it if the saved one is missing or stale.
+
+    The saved tree is keyed on the hash of the XML input, the model name, version and pipeline, and the identity of the content extractor, as stored in a metadata file next to it.
+    It is rebuilt whenever one of them changed.
+    If the XML input is missing, the saved tree is trusted and loaded with a warning.
+    In incremental mode, a tree that is only stale because of its XML input is updated instead: it is diffed with the XML by ID and content hash, and only the new or changed documents are annotated.
+    """
+    metadata = document_tree_metadata(xml_source, model, content_extractor, packed_ids, disable, saved_path)
+    if saved_metadata_matches(saved_path, metadata):
         if verbose:
             print('Loading document tree from', saved_path)
         result = load_object(saved_path)
+        saved_metadata = load_object(document_tree_metadata_path(saved_path))
+        if metadata['xml_stat'] is not None and saved_metadata.get('xml_stat') != metadata['xml_stat']:
+            # the input was touched but not changed, no need to hash it again next time
+            saved_metadata['xml_stat'] = metadata['xml_stat']
+            save_object(saved_metadata, document_tree_metadata_path(saved_path))
         return result
     else:
         if verbose:
+            if os.path.isfile(saved_path):
+                print(saved_path, 'is stale.', end=' ')
             print('Creating document tree. This might take a while...')
 
-        extractor = xmlextract(xml_source)
-        result = make_semeval_document_tree(
-            extractor.get_org_elements(), model, content_extractor)
+        previous_tree, previous_hashes = {}, {}
+        if incremental and saved_metadata_matches(saved_path, metadata, 'build_key'):
+            previous_tree = load_object(saved_path)
+            previous_hashes = load_object(
+                document_tree_metadata_path(saved_path)).get('content_hashes', {})
+
+        with disabled_pipes(model, disable):
+            result, metadata['content_hashes'], annotated = update_semeval_document_tree(
+                iterparse_org_questions(xml_source), model, content_extractor,
+                previous_tree, previous_hashes, packed_ids, batch_size, n_process)
 
         if verbose:
+            print(annotated, 'documents annotated,',
+                  sum(map(len, result.values())) - annotated, 'reused')
             print('Saving document tree to', saved_path)
         save_object(result, saved_path)
+        save_object(metadata, document_tree_metadata_path(saved_path))
 
         return result
-    
+
+def make_or_load_semeval_document_trees(specs, workers=None, verbose=False, **options):
+    """Make or load several document trees, building the missing ones concurrently.
+
+    The cached trees are loaded in the current process, whereas each missing or stale tree is built and saved in its own worker process.
+    With a single worker (ex on a single processor), the missing trees are built one after the other in the current process, sparing the start of a worker and the pickling of the model.
+
+    Parameters
+    ----------
+    specs : dict of tuple
+        Associates a name to the arguments of make_or_load_semeval_document_tree, that is to say a tuple (xml_source, saved_path, model, content_extractor).
+        The model and the content extractor must be picklable.
+
+    workers : int
+        The maximum number of worker processes, defaults to the number of trees to build (up to the number of processors).
+
+    options : dict
+        Keyword arguments given to make_or_load_semeval_document_tree for every tree (ex disable).
+
+    Returns
+    -------
+    out : dict of dict of dict
+        Associates each name to its document tree.
+    """
+    result = {}
+    missing = {}
+    for name, spec in specs.items():
+        if is_document_tree_cached(*spec, packed_ids=options.get('packed_ids', False),
+                                   disable=options.get('disable', ())):
+            result[name] = make_or_load_semeval_document_tree(*spec, verbose=verbose, **options)
+        else:
+            missing[name] = spec
+
+    if workers is None:
+        workers = min(len(missing), os.cpu_count() or 1)
+    if workers <= 1:
+        for name, spec in missing.items():
+            result[name] = make_or_load_semeval_document_tree(*spec, verbose=verbose, **options)
+    elif missing:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                name: pool.submit(make_or_load_semeval_document_tree, *spec,
+                                  verbose=verbose, **options)
+                for name, spec in missing.items()
+            }
+            for name, future in futures.items():
+                result[name] = future.result()
+
+    return {name: result[name] for name in specs}
+
+def code_digest(function):
+    """Digest of the code of a function (or of a partial application of a function), telling apart functions that share a name, like lambdas or the functions of different scripts."""
+    function = getattr(function, 'func', function)  # partial applications
+    function = getattr(function, '__func__', function)  # bound methods
+    code = getattr(function, '__code__', None)
+    if code is None:
+        return None
+
+    def code_parts(code):
+        yield code.co_code
+        yield repr(code.co_names).encode('utf-8')
+        for constant in code.co_consts:
+            if hasattr(constant, 'co_code'):
+                yield from code_parts(constant)  # nested functions, their repr holds an address
+            else:
+                yield stable_repr(constant).encode('utf-8')
+    return hashlib.sha1(b'\0'.join(code_parts(code))).hexdigest()
+
+def document_tokens(doc):
+    """Sentence extractor giving all the tokens of a document."""
+    return doc
+
+def inverse_document_frequencies_metadata(training_key, wordex, sentex, normalisation='log2'):
+    """Describe everything an inverse document frequency table depends on.
+
+    Parameters
+    ----------
+    training_key : str
+        The key of the metadata of the training document tree (see document_tree_metadata).
+
+    wordex : function(token)
+        The word extractor of the indicator.
+
+    sentex : function(document)
+        The sentence extractor of the indicator.
+
+    normalisation : str
+        Name of the normalisation of the document frequencies, 'log2' for inverse_document_frequencies.
+
+    Returns
+    -------
+    out : dict
+        The metadata, its 'key' entry being the hash of all the others.
+    """
+    metadata = {
+        'training': training_key,
+        'wordex': [callable_identity(wordex), code_digest(wordex)],
+        'sentex': [callable_identity(sentex), code_digest(sentex)],
+        'normalisation': normalisation,
+    }
+    metadata['key'] = hashlib.sha1(
+        json.dumps(metadata, sort_keys=True).encode('utf-8')).hexdigest()
+    return metadata
+
+def save_inverse_document_frequencies(inversedocfreqs, outofcorpusvalue, filename):
+    """Save an inverse document frequency table as a vocabulary and an array of values, along with its out of corpus value."""
+    save_object({
+        'vocabulary': list(inversedocfreqs.keys()),
+        'values': array('d', inversedocfreqs.values()),
+        'outofcorpusvalue': outofcorpusvalue,
+    }, filename)
+
+def load_inverse_document_frequencies(filename):
+    """Load a table saved by save_inverse_document_frequencies.
+
+    Returns
+    -------
+    out : tuple(dict, float)
+        The inverse document frequencies and the out of corpus value.
+    """
+    table = load_object(filename)
+    return dict(zip(table['vocabulary'], table['values'])), table['outofcorpusvalue']
+
+def make_or_load_inverse_document_frequencies(tree_spec, indicators, saved_prefix, normalisation='log2',
+                                              workers=1, verbose=False, **options):
+    """Load saved inverse document frequency tables, or compute and save the missing or stale ones.
+
+    Each table is keyed on its training corpus (the hash of the XML input, the model and the content extractor, see document_tree_metadata), its indicator (the identity and the code of its word extractor and of its sentence extractor) and its normalisation, as stored in a metadata file next to it.
+    The training document tree is only loaded when a table has to be computed.
+
+    Parameters
+    ----------
+    tree_spec : tuple
+        The arguments of make_or_load_semeval_document_tree for the training document tree, that is to say a tuple (xml_source, saved_path, model, content_extractor).
+
+    indicators : dict of tuple(function, function)
+        Associates the name of each indicator to its word extractor and its sentence extractor.
+
+    saved_prefix : str
+        The table of an indicator is saved as saved_prefix + '_' + name + '.idf'.
+
+    normalisation : str
+        Name of the normalisation of the document frequencies.
+
+    workers : int
+        The number of worker processes counting the document frequencies, 1 counting them in the current process (see sharded_document_frequencies).
+
+    options : dict
+        Keyword arguments given to make_or_load_semeval_document_tree (ex packed_ids).
+
+    Returns
+    -------
+    out : dict of tuple(dict, float)
+        Associates the name of each indicator to its inverse document frequencies and their out of corpus value, which is the highest inverse document frequency.
+    """
+    xml_source, tree_path, model, content_extractor = tree_spec
+    training_key = document_tree_metadata(
+        xml_source, model, content_extractor, packed_ids=options.get('packed_ids', False),
+        disable=options.get('disable', ()), saved_path=tree_path)['key']
+    training_tree = None
+    result = {}
+    for name, (wordex, sentex) in indicators.items():
+        saved_path = saved_prefix + '_' + name + '.idf'
+        metadata = inverse_document_frequencies_metadata(training_key, wordex, sentex, normalisation)
+        if saved_metadata_matches(saved_path, metadata):
+            if verbose:
+                print('Loading inverse document frequencies from', saved_path)
+            result[name] = load_inverse_document_frequencies(saved_path)
+            continue
+
+        if training_tree is None:
+            training_tree = make_or_load_semeval_document_tree(*tree_spec, verbose=verbose, **options)
+        if verbose:
+            print('Computing inverse document frequencies of', name)
+        DF, corpus_size = sharded_document_frequencies(
+            ([wordex(tok) for tok in sentex(doc)]
+             for org in training_tree.values()
+             for doc in org.values()),
+            workers)
+        inversedocfreqs = inverse_document_frequencies(None, DF, corpus_size)
+        outofcorpusvalue = max(inversedocfreqs.values(), default=0)
+
+        if verbose:
+            print('Saving inverse document frequencies to', saved_path)
+        save_inverse_document_frequencies(inversedocfreqs, outofcorpusvalue, saved_path)
+        save_object(metadata, document_tree_metadata_path(saved_path))
+        result[name] = (inversedocfreqs, outofcorpusvalue)
+
+    return result
+
 def write_scores_to_file(scores, filename, verbose=False):
     """Write a semeval score tree to a prediction file.
     
     Parameters
     ----------
     scores : dict of dict of float
-        The scores to write.
+        The scores to write, with string or packed ids.
 
     filename : str
        The name of the output file.
@@ -50,7 +661,9 @@ def write_scores_to_file(scores, filename, verbose=False):
                   for orgid, relqs in scores.items()
                   for relid, score in relqs.items()]
 
-    linebuffer.sort(key=lambda x: natural_sort_key(x[1]))
+    linebuffer.sort(key=lambda x: semeval_sort_key(x[1]))
+    linebuffer = [(semeval_id_str(orgid), semeval_id_str(relid), *rest)
+                  for orgid, relid, *rest in linebuffer]
 
     if verbose:
         print('writing scores to', filename)
@@ -64,7 +677,7 @@ def get_sorted_scores(relevancy_dict, scoretree):
         return relevancy_dict[sorteditems[0]]
 
     def sortrelated(related):
-        items = sorted(related.items(), key=lambda x: natural_sort_key(itemgetter(0)(x)))
+        items = sorted(related.items(), key=lambda x: semeval_sort_key(itemgetter(0)(x)))
         items.sort(key=itemgetter(1), reverse=True)
         return items
 
@@ -98,20 +711,53 @@ def measure_generic(measure, relevancy_dict, scoretree):
     sorted_scores = get_sorted_scores(relevancy_dict, scoretree)
     return measure(sorted_scores.values())
 
-def relevancy_dict_relevancy(relevancyfile):
+def relevancy_dict_relevancy(relevancyfile, packed_ids=False):
     rlv = csv.reader(open(relevancyfile), delimiter='\t')
     relev = {
-        row[1]: True if row[4] == 'true' else False
+        pack_semeval_id(row[1]) if packed_ids else row[1]:
+        True if row[4] == 'true' else False
         for row in rlv
     }
     return relev
     
-def relevancy_dict_xml(xmlfile):
-    extractor = xmlextract(xmlfile)
-    relev = {
-        get_semeval_id(relquestion): is_relevant_to_orgq(relquestion)
-        for relquestion in extractor.get_rel_elements()
-    }
+def relevancy_dict_xml(xmlfile, packed_ids=False, cache_dir=None):
+    """Computes a relevancy dictionnary from the attributes of a semeval xml file.
+
+    Parameters
+    ----------
+    xmlfile : str
+        Reference XML file.
+
+    packed_ids : boolean
+        Whether to key the dictionnary by packed ids.
+
+    cache_dir : str
+        If given, the dictionnary is cached in this directory, under a name derived from the hash of the XML file.
+
+    Returns
+    -------
+    out : dict of boolean
+        Dictionnary associating question IDs to their boolean relevance.
+    """
+    if cache_dir is None:
+        relev = scan_relevancy(xmlfile)
+    else:
+        cached_path = os.path.join(
+            cache_dir, 'relevancy_' + file_digest(xmlfile) + '.pickle')
+        if os.path.isfile(cached_path):
+            relev = load_object(cached_path)
+        else:
+            relev = scan_relevancy(xmlfile)
+            save_object(relev, cached_path)
+
+    if packed_ids:
+        return {pack_semeval_id(relid): relevance for relid, relevance in relev.items()}
+    return relev
+
+def relevancy_dict_corpus(corpusfile, packed_ids=False):
+    relev = corpusextract(corpusfile).relevancy_dict()
+    if packed_ids:
+        return {pack_semeval_id(relid): relevance for relid, relevance in relev.items()}
     return relev
 
 def sorted_scores_from_semeval_relevancy(relevancyfile, scoretree):
@@ -130,7 +776,8 @@ def sorted_scores_from_semeval_relevancy(relevancyfile, scoretree):
     out : float
        The mean average precision of the scores.
     """
-    return get_sorted_scores(relevancy_dict_relevancy(relevancyfile), scoretree)
+    return get_sorted_scores(
+        relevancy_dict_relevancy(relevancyfile, has_packed_ids(scoretree)), scoretree)
 
 
 def sorted_scores_from_semeval_xml(xmlfile, scoretree):
@@ -149,4 +796,5 @@ def sorted_scores_from_semeval_xml(xmlfile, scoretree):
     out : float
        The mean average precision of the scores.
     """
-    return get_sorted_scores(relevancy_dict_xml(xmlfile), scoretree)
+    return get_sorted_scores(
+        relevancy_dict_xml(xmlfile, has_packed_ids(scoretree)), scoretree)
@@ -0,0 +1,248 @@
+from array import array
+from plasem_algostruct import save_object, load_object, transformtree
+
+"""Token attributes kept by an annotation store, as string attributes of spaCy tokens.
+They are stored as ids in the vocabulary of the store.
+"""
+STORED_ATTRIBUTES = ['text', 'lower_', 'lemma_', 'pos_', 'ent_type_']
+
+
+class annotation_store(object):
+    """Columnar storage of the annotations of a document tree.
+
+    Only the token attributes used by the scorers are kept, as arrays of ids in a vocabulary shared by all the documents, along with the named entity spans.
+    The documents are stored one after the other, the tokens of document i spanning from doc_starts[i] to doc_starts[i + 1].
+    """
+
+    def __init__(self, vocabulary=None):
+        """Initialize an empty store.
+
+        Parameters
+        ----------
+        vocabulary : list of str
+            Vocabulary to share with other stores, a new one is created if None.
+        """
+        self.vocabulary = vocabulary if vocabulary is not None else []
+        self.vocabulary_ids = {string: i for i, string in enumerate(self.vocabulary)}
+        self.columns = {attribute: array('I') for attribute in STORED_ATTRIBUTES}
+        self.whitespace = array('B')
+        self.doc_starts = array('Q', [0])
+        self.ent_starts = array('Q')
+        self.ent_ends = array('Q')
+        self.ent_labels = array('I')
+        self.doc_ent_starts = array('Q', [0])
+        self.skeleton = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['vocabulary_ids']  # rebuilt on demand, it would only slow down the loading
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.vocabulary_ids = None
+
+    def intern(self, string):
+        """Retrieve the id of a string, adding it to the vocabulary if needed."""
+        if self.vocabulary_ids is None:
+            self.vocabulary_ids = {string: i for i, string in enumerate(self.vocabulary)}
+        identifier = self.vocabulary_ids.get(string)
+        if identifier is None:
+            identifier = len(self.vocabulary)
+            self.vocabulary.append(string)
+            self.vocabulary_ids[string] = identifier
+        return identifier
+
+    def add_document(self, doc):
+        """Store a spaCy document.
+
+        Parameters
+        ----------
+        doc : spacy.tokens.Doc
+            The document to store.
+
+        Returns
+        -------
+        out : int
+            The index of the document in the store.
+        """
+        offset = self.doc_starts[-1]
+        for token in doc:
+            for attribute in STORED_ATTRIBUTES:
+                self.columns[attribute].append(self.intern(getattr(token, attribute)))
+            self.whitespace.append(1 if token.whitespace_ else 0)
+        for ent in doc.ents:
+            self.ent_starts.append(offset + ent.start)
+            self.ent_ends.append(offset + ent.end)
+            self.ent_labels.append(self.intern(ent.label_))
+        self.doc_starts.append(offset + len(doc))
+        self.doc_ent_starts.append(len(self.ent_starts))
+        return len(self.doc_starts) - 2
+
+    def get_document(self, index):
+        """Retrieve a view of a stored document."""
+        return doc_view(self, index)
+
+    def document_tree(self):
+        """Retrieve the stored document tree, made of views of the documents.
+
+        Returns
+        -------
+        out : dict of dict of doc_view
+            The document tree, with the same layout as the one that was stored.
+        """
+        return transformtree(self.get_document, self.skeleton)
+
+
+class token_view(object):
+    """Read-only token of an annotation store, behaving like a spaCy token for the stored attributes."""
+    __slots__ = ('store', 'i')
+
+    def __init__(self, store, i):
+        self.store = store
+        self.i = i
+
+    def get_attribute(self, attribute):
+        return self.store.vocabulary[self.store.columns[attribute][self.i]]
+
+    @property
+    def text(self):
+        return self.get_attribute('text')
+
+    @property
+    def lower_(self):
+        return self.get_attribute('lower_')
+
+    @property
+    def lemma_(self):
+        return self.get_attribute('lemma_')
+
+    @property
+    def pos_(self):
+        return self.get_attribute('pos_')
+
+    @property
+    def ent_type_(self):
+        return self.get_attribute('ent_type_')
+
+    @property
+    def ent_type(self):
+        """Non-zero if the token is part of a named entity (it is not spaCy's hash of the type)."""
+        return 1 + self.store.columns['ent_type_'][self.i] if self.ent_type_ else 0
+
+    @property
+    def whitespace_(self):
+        return ' ' if self.store.whitespace[self.i] else ''
+
+    @property
+    def text_with_ws(self):
+        return self.text + self.whitespace_
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return self.text
+
+    def __len__(self):
+        return len(self.text)
+
+
+class span_view(object):
+    """Read-only sequence of tokens of an annotation store, behaving like a spaCy span."""
+    __slots__ = ('store', 'start', 'end', 'label')
+
+    def __init__(self, store, start, end, label=None):
+        self.store = store
+        self.start = start
+        self.end = end
+        self.label = label
+
+    @property
+    def label_(self):
+        return self.store.vocabulary[self.label] if self.label is not None else ''
+
+    @property
+    def text(self):
+        text = ''.join(token.text_with_ws for token in self)
+        if self.end > self.start and self.store.whitespace[self.end - 1]:
+            return text[:-1]  # like spaCy, a span does not end with whitespace
+        return text
+
+    def __iter__(self):
+        for i in range(self.start, self.end):
+            yield token_view(self.store, i)
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('token index out of range')
+        return token_view(self.store, self.start + i)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return self.text
+
+
+class doc_view(span_view):
+    """Read-only document of an annotation store, behaving like a spaCy document for the stored attributes."""
+    __slots__ = ('index',)
+
+    def __init__(self, store, index):
+        super().__init__(store, store.doc_starts[index], store.doc_starts[index + 1])
+        self.index = index
+
+    @property
+    def text(self):
+        return ''.join(token.text_with_ws for token in self)
+
+    @property
+    def ents(self):
+        store = self.store
+        return tuple(
+            span_view(store, store.ent_starts[ent], store.ent_ends[ent], store.ent_labels[ent])
+            for ent in range(store.doc_ent_starts[self.index],
+                             store.doc_ent_starts[self.index + 1])
+        )
+
+
+def store_document_tree(document_tree, vocabulary=None):
+    """Convert a document tree of spaCy documents to an annotation store.
+
+    Parameters
+    ----------
+    document_tree : dict of dict of spacy.tokens.Doc
+        The tree to convert, as built by make_semeval_document_tree.
+
+    vocabulary : list of str
+        Vocabulary to share with other stores.
+
+    Returns
+    -------
+    out : annotation_store
+        The store holding the documents of the tree.
+    """
+    store = annotation_store(vocabulary)
+    store.skeleton = transformtree(store.add_document, document_tree)
+    return store
+
+
+def save_document_tree_store(document_tree, filename, vocabulary=None):
+    """Save a document tree of spaCy documents as an annotation store."""
+    save_object(store_document_tree(document_tree, vocabulary), filename)
+
+
+def load_document_tree_store(filename):
+    """Load a document tree saved by save_document_tree_store, made of views of the documents.
+
+    Returns
+    -------
+    out : dict of dict of doc_view
+    """
+    return load_object(filename).document_tree()
@@ -1,7 +1,10 @@
+import os
 import math
-from itertools import chain
-from functools import reduce
-from collections import Counter, defaultdict
+from array import array
+from itertools import chain, islice
+from functools import reduce, partial
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 
 def term_frequencies(bag):
     documentlen = sum(bag.values())
@@ -17,10 +20,84 @@ def document_frequencies(corpus):
     return result
 
 
-def inverse_document_frequencies(corpus, DF=None):
+def document_frequencies_chunk(documents):
+    """Document frequencies of a chunk of documents, along with its number of documents."""
+    return document_frequencies(documents), len(documents)
+
+def sharded_document_frequencies(documents, workers=1, chunk_size=1000):
+    """Document frequencies of a corpus, counted chunk by chunk in worker processes.
+
+    The documents are read lazily, a chunk being materialized only while it is waiting for a worker, so the whole corpus never has to be held in memory.
+    The partial counts of the chunks are merged as they are completed.
+
+    Parameters
+    ----------
+    documents : iterable of iterable of str
+        The documents, as sequences of terms (ex a generator of token lists).
+
+    workers : int
+        The number of worker processes, None for the number of processors.
+        Defaults to 1, counting in the current process: the chunks are pickled to be sent to the workers, which costs more than counting them on corpora the size of SemEval's.
+
+    chunk_size : int
+        The number of documents sent to a worker at once.
+
+    Returns
+    -------
+    out : tuple(Counter, int)
+        The document frequencies and the number of documents, to give to inverse_document_frequencies.
+    """
+    documents = iter(documents)
+    chunks = iter(lambda: [tuple(document) for document in islice(documents, chunk_size)], [])
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    DF = Counter()
+    corpus_size = 0
+    if workers == 1:
+        for chunk_DF, chunk_len in map(document_frequencies_chunk, chunks):
+            DF.update(chunk_DF)
+            corpus_size += chunk_len
+        return DF, corpus_size
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(document_frequencies_chunk, chunk))
+            while len(pending) > 2 * workers or (pending and pending[0].done()):
+                chunk_DF, chunk_len = pending.popleft().result()
+                DF.update(chunk_DF)
+                corpus_size += chunk_len
+        for future in pending:
+            chunk_DF, chunk_len = future.result()
+            DF.update(chunk_DF)
+            corpus_size += chunk_len
+    return DF, corpus_size
+
+def inverse_document_frequencies(corpus, DF=None, corpus_size=None):
+    """Inverse document frequencies of the terms of a corpus.
+
+    Parameters
+    ----------
+    corpus : sequence of iterable of str
+        The documents, as sequences of terms, it may be None if both DF and corpus_size are given.
+
+    DF : Counter
+        The document frequencies of the corpus, computed from the corpus if None.
+
+    corpus_size : int
+        The number of documents of the corpus, defaults to len(corpus).
+
+    Returns
+    -------
+    out : dict
+        The inverse document frequency of each term.
+    """
     if DF == None:
         DF = document_frequencies(corpus)
-    return {term: math.log2(len(corpus)/docfreq)
+    if corpus_size is None:
+        corpus_size = len(corpus)
+    return {term: math.log2(corpus_size/docfreq)
             for term, docfreq in DF.items()}
 
 def tf_idf(term, termfreq, inversedocfreq, outofcorpusvalue):
@@ -50,10 +127,270 @@ def tf_idf(term, termfreq, inversedocfreq, outofcorpusvalue):
         return outofcorpusvalue
     return termfreq[term] * inversedocfreq[term]
 
+#######################
+# interned vocabulary #
+#######################
+class vocabulary(object):
+    """Global vocabulary mapping each (indicator, normalised form) pair to a dense integer id.
+
+    The indicator is the name of the way the forms were extracted (ex 'text_document' or 'lemma_document'), so that the same string extracted by two indicators gets two ids.
+    The filters used with the vocabulary are compiled: each one is given a bit and evaluated once per form, the results being stored as a bitmask per term id, so that any combination of filters is applied with a single test.
+    """
+    def __init__(self):
+        self.ids = {}  # form to id dictionary of each indicator
+        self.entries = []
+        self.filter_bits = {}
+        self.bitmasks = array('Q')  # of the ids compiled so far
+
+    def indicator_ids(self, indicator):
+        ids = self.ids.get(indicator)
+        if ids is None:
+            ids = self.ids[indicator] = {}
+        return ids
+
+    def intern(self, indicator, form):
+        """Retrieve the id of a form, adding it to the vocabulary if needed."""
+        ids = self.indicator_ids(indicator)
+        termid = ids.get(form)
+        if termid is None:
+            termid = ids[form] = len(self.entries)
+            self.entries.append((indicator, form))
+        return termid
+
+    def lookup(self, indicator, form):
+        """Retrieve the id of a form, None if it is not in the vocabulary."""
+        return self.ids.get(indicator, {}).get(form)
+
+    def encode(self, indicator, forms):
+        """Retrieve the ids of a list of forms, adding the new ones to the vocabulary."""
+        termids = list(map(self.indicator_ids(indicator).get, forms))
+        if None in termids:
+            termids = [self.intern(indicator, form) if termid is None else termid
+                       for termid, form in zip(termids, forms)]
+        return termids
+
+    def form(self, termid):
+        return self.entries[termid][1]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def encode_idf(self, indicator, inversedocfreqs):
+        """Convert an inverse document frequency dictionary to an interned_idf table."""
+        return interned_idf(self, indicator, inversedocfreqs)
+
+    def filter_mask(self, filters):
+        """Bitmask of a combination of filters, registering the new filters.
+
+        A term id passes the filters when bitmasks[termid] & mask == mask (see compile).
+
+        Parameters
+        ----------
+        filters : iterable of function(str)
+            The filters, at most 64 different ones being registered in a vocabulary.
+
+        Returns
+        -------
+        out : int
+            The bitmask.
+        """
+        mask = 0
+        for flt in filters:
+            bit = self.filter_bits.get(flt)
+            if bit is None:
+                if len(self.filter_bits) == 64:
+                    raise ValueError('at most 64 filters can be compiled')
+                bit = self.filter_bits[flt] = 1 << len(self.filter_bits)
+                for termid in range(len(self.bitmasks)):
+                    if flt(self.form(termid)):
+                        self.bitmasks[termid] |= bit
+            mask |= bit
+        return mask
+
+    def compile(self):
+        """Evaluate the registered filters on the forms interned since the last compilation.
+
+        Returns
+        -------
+        out : array of int
+            The bitmask of each term id, the bit of a filter being set when the form passes it.
+        """
+        for termid in range(len(self.bitmasks), len(self.entries)):
+            form = self.form(termid)
+            self.bitmasks.append(sum(bit for flt, bit in self.filter_bits.items() if flt(form)))
+        return self.bitmasks
+
+class interned_idf(object):
+    """Inverse document frequencies stored in an array indexed by term ids, NaN standing for out of corpus terms."""
+    def __init__(self, vocabulary, indicator, inversedocfreqs):
+        self.values = array('d', [math.nan]) * len(vocabulary)
+        for term, idf in inversedocfreqs.items():
+            termid = vocabulary.intern(indicator, term)
+            if termid >= len(self.values):
+                self.values.extend([math.nan] * (termid + 1 - len(self.values)))
+            self.values[termid] = idf
+
+    def __getitem__(self, termid):
+        return self.values[termid] if termid < len(self.values) else math.nan
+
+def interned_tf_idf(termid, termfreq, inversedocfreq, outofcorpusvalue):
+    """Term Frequency - Inverse Document Frequency of a term id, see tf_idf.
+
+    Parameters
+    ----------
+    termid : int
+        The id of the term.
+
+    termfreq : dict
+        The term frequencies of the document, keyed by term ids.
+
+    inversedocfreq : interned_idf
+        The inverse document frequencies of the corpus.
+
+    Returns
+    -------
+    out : float
+        The TF-IDF value of the term.
+    """
+    if termid not in termfreq:
+        return 0
+    idf = inversedocfreq[termid]
+    if math.isnan(idf):
+        return outofcorpusvalue
+    return termfreq[termid] * idf
+
+"""Indicator of the text of the tokens, on which the filters of the similarity functions are evaluated."""
+TOKEN_TEXT = 'token_text'
+
+def filtered_bag(context, termids, surfaceids):
+    """Bag of the term ids of the units of a document whose surface form passes the filters of a context.
+
+    Parameters
+    ----------
+    context : scorer or comparator
+        Holds the vocabulary in which the ids are interned, and the filters.
+
+    termids : list of int
+        The term of each unit, counted in the bag.
+
+    surfaceids : list of int
+        The surface form of each unit, on which the filters are evaluated.
+
+    Returns
+    -------
+    out : Counter
+        The bag, in the order of the first occurrences of the terms.
+    """
+    if not context.filters:
+        return Counter(termids)
+    mask = context.vocabulary.filter_mask(context.filters)
+    bitmasks = context.vocabulary.compile()
+    return Counter(termid for termid, surfaceid in zip(termids, surfaceids)
+                   if bitmasks[surfaceid] & mask == mask)
+
+def extractor_units(vocabulary, indicator, wordex, sentex, doc):
+    """Units of scorer_bag: the ids of the extracted words, on which the filters are evaluated too.
+
+    Returns
+    -------
+    out : tuple(list of int, list of int)
+        The term ids and the surface form ids of the units, in the order of the document.
+    """
+    termids = vocabulary.encode(indicator, [wordex(unit) for unit in sentex(doc)])
+    return termids, termids
+
+def scorer_units(self, doc):
+    """Units of a document extracted with the extractors of a scorer, see extractor_units."""
+    return extractor_units(self.vocabulary, self.indicator, self.wordex, self.sentex, doc)
+
+#############
+# bag cache #
+#############
+class bag_cache(object):
+    """Bounded cache of the bags of words of documents, evicting the least recently used bags.
+
+    A bag is keyed by the identity of its document and by the way it is made (bag maker, word extractor, sentence extractor, indicator, filters and vocabulary), so that a document is bagged once per configuration even when the cache is shared by several scorers or comparators.
+    The documents are kept alive by the cache along with their bags, so that their identities cannot be reused.
+    The cached bags are shared and must not be modified.
+    """
+    def __init__(self, maxsize=65536):
+        """
+        Parameters
+        ----------
+        maxsize : int
+            Maximum number of bags kept, None for an unbounded cache.
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, doc, bagmaker, key):
+        """Retrieve the bag of a document, making it with bagmaker(doc) if it is not cached.
+
+        Parameters
+        ----------
+        doc : document
+            The document to bag.
+
+        bagmaker : function(document)
+            Function making the bag.
+
+        key : hashable
+            Description of the way the bag is made, the identity of the document being added to it.
+        """
+        key = (id(doc), key)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1]
+        self.misses += 1
+        bag = bagmaker(doc)
+        self.entries[key] = (doc, bag)
+        if self.maxsize is not None and len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return bag
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def report(self):
+        """Retrieve a human readable summary of the cache efficiency."""
+        total = self.hits + self.misses
+        return '%d bags cached, %d hits, %d misses (%.1f%% hits)' % (
+            len(self.entries), self.hits, self.misses,
+            100 * self.hits / total if total else 0)
+
+def cached_bag(context, doc, bagmaker):
+    """Make the bag of a document with bagmaker(context, doc), through the bag cache of the context if it has one.
+
+    Parameters
+    ----------
+    context : scorer or comparator
+        The bag cache is read from its bagcache attribute, the key of the bag being made of its wordex, sentex, indicator, filters and vocabulary attributes (the interned ids of a bag depend on its vocabulary).
+
+    doc : document
+
+    bagmaker : function(context, document)
+        Module level function making the bag.
+    """
+    cache = context.bagcache
+    if cache is None:
+        return bagmaker(context, doc)
+    key = (bagmaker, context.wordex, context.sentex, context.indicator,
+           tuple(context.filters or ()), context.vocabulary)
+    return cache.get(doc, partial(bagmaker, context), key)
+
 class scorer(object):
     def __init__(self, wordex, sentex, filters,
                  inversedocfreqs, outofcorpusvalue,
-                 scorerfunction):
+                 scorerfunction, vocabulary=None, indicator=None, bagcache=None):
         """All informations needed to compute a score.
         The score is computed using an external custom similarity function which works by accessing to the informations set here.
 
@@ -65,6 +402,12 @@ class scorer(object):
 
         filters : 
 
+        vocabulary : vocabulary
+            Vocabulary used by the interned scorer functions, along with the indicator naming the extracted words.
+
+        bagcache : bag_cache
+            Cache of the bags of the documents, that can be shared with other scorers.
+
         Returns
         -------
         out : 
@@ -76,6 +419,11 @@ class scorer(object):
         self.inversedocfreqs = inversedocfreqs
         self.outofcorpusvalue = outofcorpusvalue
         self.scorerfunction = scorerfunction
+        self.vocabulary = vocabulary
+        self.indicator = indicator
+        self.bagcache = bagcache
+        if vocabulary is not None:
+            self.interned_idf = vocabulary.encode_idf(indicator, inversedocfreqs)
 
     def get_score(self, *args):
         return self.scorerfunction(self, *args)
@@ -94,12 +442,16 @@ class comparator(dotdict):
         Parameters
         ----------
         context : dict
-        
+            When it holds a vocabulary and an indicator, the inverse document frequencies are interned for the interned similarities.
+            When it holds a bagcache (see bag_cache), the bags of the documents are cached.
+
         similarity : function(context, reference, candidate)
             Similarity function that will use the context to determine the similarity between two questions.
         """
         super().__init__(context)
         self.similarity = similarity
+        if self.vocabulary is not None and self.interned_idf is None:
+            self.interned_idf = self.vocabulary.encode_idf(self.indicator, self.inversedocfreqs)
 
     def getscore(self, reference, candidate):
         return self.similarity(self, reference, candidate)
@@ -121,12 +473,8 @@ def tf_idf_scorer(self, doca, docb):
     -------
     out : 
     """
-    def bag_maker(doc):
-        return Counter(word
-                for word in map(self.wordex, self.sentex(doc))
-                if all(flt(word) for flt in self.filters))
-    baga = bag_maker(doca)
-    bagb = bag_maker(docb)
+    baga = cached_bag(self, doca, scorer_bag)
+    bagb = cached_bag(self, docb, scorer_bag)
     intersection = baga & bagb
     termfreq = term_frequencies(baga + bagb)
 
@@ -139,6 +487,35 @@ def tf_idf_scorer(self, doca, docb):
     )
 
 
+def scorer_bag(self, doc):
+    """Bag of words of a document, as made by tf_idf_scorer."""
+    return Counter(word
+                   for word in map(self.wordex, self.sentex(doc))
+                   if all(flt(word) for flt in self.filters))
+
+def interned_scorer_bag(self, doc):
+    """Bag of term ids of a document, as made by interned_tf_idf_scorer."""
+    return filtered_bag(self, *scorer_units(self, doc))
+
+def interned_tf_idf_scorer(self, doca, docb):
+    """tf_idf_scorer working on term ids.
+
+    The scorer must have been given a vocabulary and an indicator.
+    The filters are evaluated once per term of the vocabulary and the inverse document frequencies are read from an array.
+    """
+    baga = cached_bag(self, doca, interned_scorer_bag)
+    bagb = cached_bag(self, docb, interned_scorer_bag)
+    intersection = baga & bagb
+    termfreq = term_frequencies(baga + bagb)
+
+    return sum(
+        interned_tf_idf(termid,
+                        termfreq,
+                        self.interned_idf,
+                        self.outofcorpusvalue) * len(intersection)
+        for termid in intersection
+    )
+
 def generic_similarity(context, reference, candidate, bagmaker):
     bagref = bagmaker(reference)
     bagcan = bagmaker(candidate)
@@ -170,10 +547,10 @@ def baseline_similarity(context, reference, candidate):
     out : float
         The baseline similarity score.
     """
-    def bagmaker(doc):
-        return Counter(str(word) for word in doc)
+    return generic_similarity(context, reference, candidate, partial(cached_bag, context, bagmaker=baseline_bag))
 
-    return generic_similarity(context, reference, candidate, bagmaker)
+def baseline_bag(context, doc):
+    return Counter(str(word) for word in doc)
 
 def filters_baseline_similarity(context, reference, candidate):
     """Baseline similarity using filters.
@@ -194,12 +571,12 @@ def filters_baseline_similarity(context, reference, candidate):
     out : float
         The baseline with filters similarity score.
     """
-    def makebag(doc):
-        return Counter(word.lower()
-                       for word in map(str, doc)
-                       if all(pred(word) for pred in context.filters))
-    
-    return generic_similarity(context, reference, candidate, makebag)
+    return generic_similarity(context, reference, candidate, partial(cached_bag, context, bagmaker=filters_baseline_bag))
+
+def filters_baseline_bag(context, doc):
+    return Counter(word.lower()
+                   for word in map(str, doc)
+                   if all(pred(word) for pred in context.filters))
 
 
 def filters_lemmas_similarity(context, reference, candidate):
@@ -221,12 +598,76 @@ def filters_lemmas_similarity(context, reference, candidate):
     out : float
         The lemmas similarity score with filters.
     """
-    def makebag(doc):
-        return Counter(word.lemma_
-                       for word in doc
-                       if all(pred(str(word)) for pred in context.filters))
-    
-    return generic_similarity(context, reference, candidate, makebag)
+    return generic_similarity(context, reference, candidate, partial(cached_bag, context, bagmaker=filters_lemmas_bag))
+
+def filters_lemmas_bag(context, doc):
+    return Counter(word.lemma_
+                   for word in doc
+                   if all(pred(str(word)) for pred in context.filters))
+
+def interned_baseline_bag(context, doc):
+    return Counter(context.vocabulary.encode(context.indicator, [str(word) for word in doc]))
+
+def filters_baseline_units(context, doc):
+    """Units of filters_baseline_bag: the ids of the lowercased text of the tokens, and of their text, on which the filters are evaluated."""
+    words = [str(word) for word in doc]
+    return (context.vocabulary.encode(context.indicator, [word.lower() for word in words]),
+            context.vocabulary.encode(TOKEN_TEXT, words))
+
+def interned_filters_baseline_bag(context, doc):
+    return filtered_bag(context, *filters_baseline_units(context, doc))
+
+def filters_lemmas_units(context, doc):
+    """Units of filters_lemmas_bag: the ids of the lemmas of the tokens, and of their text, on which the filters are evaluated."""
+    words = list(doc)
+    return (context.vocabulary.encode(context.indicator, [word.lemma_ for word in words]),
+            context.vocabulary.encode(TOKEN_TEXT, [str(word) for word in words]))
+
+def interned_filters_lemmas_bag(context, doc):
+    return filtered_bag(context, *filters_lemmas_units(context, doc))
+
+"""Bag makers of the interned counterparts of the similarity functions based on generic_similarity, the forms being interned as they are extracted."""
+INTERNED_BAGS = {
+    baseline_similarity: interned_baseline_bag,
+    filters_baseline_similarity: interned_filters_baseline_bag,
+    filters_lemmas_similarity: interned_filters_lemmas_bag,
+}
+
+def interned_generic_similarity(context, reference, candidate, bagmaker):
+    """generic_similarity working on term ids, bagmaker(doc) making bags of term ids.
+
+    The context must hold a vocabulary and an indicator (see comparator).
+    """
+    bagref = bagmaker(reference)
+    bagcan = bagmaker(candidate)
+    termfreq = term_frequencies(bagref + bagcan)
+    intersection = bagref & bagcan
+    inversedocfreq, outofcorpusvalue = context.interned_idf, context.outofcorpusvalue
+
+    return sum(
+        interned_tf_idf(termid, termfreq, inversedocfreq, outofcorpusvalue)
+        for termid in intersection
+    )
+
+def make_interned_similarity(similarity):
+    """Make the counterpart of a similarity function based on generic_similarity working on term ids.
+
+    Parameters
+    ----------
+    similarity : function(context, reference, candidate)
+        baseline_similarity, filters_baseline_similarity or filters_lemmas_similarity.
+
+    Returns
+    -------
+    out : function(context, reference, candidate)
+        The interned similarity function, that gives the same scores.
+    """
+    bagmaker = INTERNED_BAGS[similarity]
+
+    def interned_similarity(context, reference, candidate):
+        return interned_generic_similarity(
+            context, reference, candidate, partial(cached_bag, context, bagmaker=bagmaker))
+    return interned_similarity
 
 
 def create_unit_dict(wordex, sentex, filters, doc):
@@ -315,11 +756,8 @@ def generic_weights_scorer(context, doca, docb, weights_functions):
     out : float
         Similarity score of the documents.
     """
-    unitsa = create_unit_dict(context.wordex, lambda x: x, context.filters, doca)
-    unitsb = create_unit_dict(context.wordex, lambda x: x, context.filters, docb)
-
-    counta = Counter(word for word, occ in unitsa.items() for _ in occ)
-    countb = Counter(word for word, occ in unitsb.items() for _ in occ)
+    unitsa, counta = cached_bag(context, doca, weights_units)
+    unitsb, countb = cached_bag(context, docb, weights_units)
         
     score = 0
     intersection = counta & countb
@@ -333,3 +771,8 @@ def generic_weights_scorer(context, doca, docb, weights_functions):
         tfidf = tf_idf(el, termfreq, context.inversedocfreqs, context.outofcorpusvalue)
         score += tfidf * coef
     return score
+
+def weights_units(context, doc):
+    """Units of a document and their bag of words, as used by generic_weights_scorer."""
+    units = create_unit_dict(context.wordex, lambda x: x, context.filters, doc)
+    return units, Counter(word for word, occ in units.items() for _ in occ)
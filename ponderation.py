@@ -61,33 +61,28 @@ def orgmodetable(matrix, header=False):
 
 
 import spacy
-from plasem_taln import inverse_document_frequencies
-from plasem_semeval import make_or_load_semeval_document_tree
+from plasem_semeval import make_or_load_semeval_document_trees
+from plasem_semeval import make_or_load_inverse_document_frequencies, document_tokens
 from semeval_xml import get_semeval_content
 
 nlp = spacy.load('en')
-doctrees = {
-    corpus: make_or_load_semeval_document_tree(
-        corpusxml,
-        'spacy_en_' + corpus + '_questions.pickle',
-        nlp,
-        get_semeval_content)
+doctrees = make_or_load_semeval_document_trees({
+    corpus: (corpusxml,
+             'spacy_en_' + corpus + '_questions.pickle',
+             nlp,
+             get_semeval_content)
     for corpus, corpusxml in corpora.items()
-}
+})
 
 training_file = 'SemEval2016-Task3-CQA-QL-train-part1.xml'
-traindoctree = make_or_load_semeval_document_tree(
-    training_file,
-    'spacy_en_train2016p1_questions.pickle',
-    nlp,
-    get_semeval_content)
-
-inversedocfreqs = inverse_document_frequencies(
-    [[wordextractor(tok) for tok in doc]
-     for org in traindoctree.values()
-     for doc in org.values()]
-)
-outofcorpusvalue = max(inversedocfreqs.values())
+inversedocfreqs, outofcorpusvalue = make_or_load_inverse_document_frequencies(
+    (training_file,
+     'spacy_en_train2016p1_questions.pickle',
+     nlp,
+     get_semeval_content),
+    {indicatorname: (wordextractor, document_tokens)},
+    'spacy_en_train2016p1'
+)[indicatorname]
 
 context = {'inversedocfreqs': inversedocfreqs,
            'outofcorpusvalue': outofcorpusvalue}
@@ -200,11 +195,12 @@ for corpus, *rest in parameters:
 
     from plasem_semeval import write_scores_to_file
     from plasem_taln import comparator
+    from plasem_batch import make_batch_score_tree
     
     comp = comparator(context, similarity)
-    scores = make_score_tree(
+    scores = make_batch_score_tree(
         doctrees[corpus],
-        comp.getscore
+        comp
     )
     # from plasem_semeval import sorted_scores_from_semeval_xml
     # from plasem_algostruct import mean_average_precision
@@ -7,6 +7,7 @@ relevancy = {'2016': 'scorer/SemEval2016-Task3-CQA-QL-test.xml.subtaskB.relevanc
              '2017': 'scorer/SemEval2017-Task3-CQA-QL-test.xml.subtaskB.relevancy'}
 def wordextractor(tok):
     return tok.lemma_
+indicatorname = 'lemma_tokens'
 import subprocess
 from plasem_algostruct import transformtree
 
@@ -61,33 +62,28 @@ def orgmodetable(matrix, header=False):
 
 
 import spacy
-from plasem_taln import inverse_document_frequencies
-from plasem_semeval import make_or_load_semeval_document_tree
+from plasem_semeval import make_or_load_semeval_document_trees
+from plasem_semeval import make_or_load_inverse_document_frequencies, document_tokens
 from semeval_xml import get_semeval_content
 
 nlp = spacy.load('en')
-doctrees = {
-    corpus: make_or_load_semeval_document_tree(
-        corpusxml,
-        'spacy_en_' + corpus + '_questions.pickle',
-        nlp,
-        get_semeval_content)
+doctrees = make_or_load_semeval_document_trees({
+    corpus: (corpusxml,
+             'spacy_en_' + corpus + '_questions.pickle',
+             nlp,
+             get_semeval_content)
     for corpus, corpusxml in corpora.items()
-}
+})
 
 training_file = 'SemEval2016-Task3-CQA-QL-train-part1.xml'
-traindoctree = make_or_load_semeval_document_tree(
-    training_file,
-    'spacy_en_train2016p1_questions.pickle',
-    nlp,
-    get_semeval_content)
-
-inversedocfreqs = inverse_document_frequencies(
-    [[wordextractor(tok) for tok in doc]
-     for org in traindoctree.values()
-     for doc in org.values()]
-)
-outofcorpusvalue = max(inversedocfreqs.values())
+inversedocfreqs, outofcorpusvalue = make_or_load_inverse_document_frequencies(
+    (training_file,
+     'spacy_en_train2016p1_questions.pickle',
+     nlp,
+     get_semeval_content),
+    {indicatorname: (wordextractor, document_tokens)},
+    'spacy_en_train2016p1'
+)[indicatorname]
 
 context = {'inversedocfreqs': inversedocfreqs,
            'outofcorpusvalue': outofcorpusvalue}
@@ -176,16 +172,22 @@ caption = 'Semeval - Scores MAP - Lemmes avec Filtres'
 parameters = list(product(corpora, filters_partition))
 parameters_description = ('Édition', 'Filtres', 'Score MAP')
 description_functions = [lambda x: x, get_filters_descr]
-for corpus, *rest in parameters:
-    context['filters'] = [filters[key] for key in rest[0]]
-    from plasem_semeval import write_scores_to_file
-    from plasem_taln import comparator
-    
-    comp = comparator(context, similarity)
-    scores = make_score_tree(
+from plasem_semeval import write_scores_to_file
+from plasem_taln import comparator
+from plasem_batch import make_filtered_score_trees
+
+filtered_scores = {
+    corpus: make_filtered_score_trees(
         doctrees[corpus],
-        comp.getscore
+        comparator(context, similarity),
+        filters,
+        filters_partition
     )
+    for corpus in corpora
+}
+
+for corpus, *rest in parameters:
+    scores = filtered_scores[corpus][rest[0]]
     predfile = getpredfilename(methodname, corpus, *rest)
     write_scores_to_file(scores, predfile)
     from plasem_semeval import sorted_scores_from_semeval_relevancy
@@ -1,11 +1,15 @@
 #!/usr/bin/python
 from itertools import product, combinations
+from functools import partial
 import spacy
 from spacy.lang.en.stop_words import STOP_WORDS
 from plasem_algostruct import *
 from plasem_taln import *
 from semeval_xml import get_semeval_content
-from plasem_semeval import make_or_load_semeval_document_tree, write_scores_to_file
+from plasem_semeval import make_or_load_semeval_document_trees, write_scores_to_file
+from plasem_semeval import make_or_load_inverse_document_frequencies
+from plasem_semeval import plan_pipeline, planned_tree_path
+from plasem_batch import unit_tree
 
 debug_mode = False;
 seek_optimal_ner_ponderation = False
@@ -137,62 +141,65 @@ def getindicatorfunctions(key):
 
 training_file = 'SemEval2016-Task3-CQA-QL-train-part1.xml'
 
-training_doctree = make_or_load_semeval_document_tree(
-    training_file,
-    'spacy_en_train2016p1_questions.pickle',
-    models['spacy_en'],
-    get_semeval_content,
-    verbose=True
+disable = plan_pipeline(models['spacy_en'], all_indicators.values(), [entity_weighter])
+
+indicator_idfs = make_or_load_inverse_document_frequencies(
+    (training_file,
+     planned_tree_path('spacy_en_train2016p1_questions.pickle', disable),
+     models['spacy_en'],
+     get_semeval_content),
+    {wordex + '_' + sentex: getindicatorfunctions(indicator)
+     for indicator, (wordex, sentex) in all_indicators.items()},
+    planned_tree_path('spacy_en_train2016p1', disable),
+    verbose=True,
+    disable=disable
 )
 
-inversedocfreqs = {
-    wordex + '_' + sentex: inverse_document_frequencies(
-        [[wordextractors[wordex](tok) for tok in sentenceextractors[sentex](doc)]
-         for org in training_doctree.values()
-         for doc in org.values()]
-    )
-    for wordex, sentex in all_indicators.values()
-}
-
-outofcorpusvalue = max(inversedocfreqs['text_document'].values())
-doctrees = {
-    '_'.join((model, corpus, extractor)): make_or_load_semeval_document_tree(
-        corpuses[corpus],
-        '_'.join((model, corpus, extractor) )+ '.pickle',
-        models[model],
-        extractors[extractor],
-        verbose=True
-    )
-    for model, corpus, extractor in product(models, corpuses, extractors)
-}
+inversedocfreqs = {name: idf for name, (idf, _) in indicator_idfs.items()}
+outofcorpusvalue = indicator_idfs['text_document'][1]
+doctrees = make_or_load_semeval_document_trees(
+    {
+        '_'.join((model, corpus, extractor)): (
+            corpuses[corpus],
+            planned_tree_path('_'.join((model, corpus, extractor) )+ '.pickle', disable),
+            models[model],
+            extractors[extractor]
+        )
+        for model, corpus, extractor in product(models, corpuses, extractors)
+    },
+    verbose=True,
+    disable=disable
+)
 
 def getpredfilename(doctree, indicator, filterspartition, methodcategory):
     return 'predictions/' + '_'.join((doctree, indicator, *filterspartition,
                      methodcategory, 'scores.pred'))
 
 bruteforce_methods = (doctrees, all_indicators, filters_partition)
+interned_vocabulary = vocabulary()
 
-
-for doctree, indicator, filterspartition in product(*bruteforce_methods):
+for doctree, indicator in product(*bruteforce_methods[:2]):
     wordex, sentex = all_indicators[indicator]
-    customscorer = scorer(
-        wordextractors[wordex],
-        sentenceextractors[sentex],
-        [filters[filterkey] for filterkey in filterspartition],
-        inversedocfreqs[wordex + '_' + sentex],
-        outofcorpusvalue,
-        tf_idf_scorer
-    )
-
-    scores = make_score_tree(
+    units = unit_tree(
         doctrees[doctree],
-        customscorer.get_score
+        partial(extractor_units, interned_vocabulary, wordex + '_' + sentex,
+                wordextractors[wordex], sentenceextractors[sentex]),
+        interned_vocabulary,
+        filters
+    )
+    score_trees = units.filtered_score_trees(
+        filters_partition,
+        interned_vocabulary.encode_idf(wordex + '_' + sentex, inversedocfreqs[wordex + '_' + sentex]),
+        outofcorpusvalue,
+        intersection_weighted=True
     )
 
-    prediction_file = getpredfilename(doctree, indicator, filterspartition, 'bruteforce')
-    write_scores_to_file(scores, prediction_file, verbose=True)
+    for filterspartition, scores in score_trees.items():
+        prediction_file = getpredfilename(doctree, indicator, filterspartition, 'bruteforce')
+        write_scores_to_file(scores, prediction_file, verbose=True)
 
 ponderated_methods = (doctrees, morphologic_indicators, filters_partition)
+bagcache = bag_cache()
 
 for doctree, indicator, fltrs in product(*ponderated_methods):
     wordex, sentex = all_indicators[indicator]
@@ -203,7 +210,8 @@ for doctree, indicator, fltrs in product(*ponderated_methods):
         [filters[filterkey] for filterkey in fltrs],
         inversedocfreqs[wordex + '_' + sentex],
         outofcorpusvalue,
-        lambda this, a, b : generic_weights_scorer(this, a, b, [(0.6, entity_weighter)])
+        lambda this, a, b : generic_weights_scorer(this, a, b, [(0.6, entity_weighter)]),
+        bagcache=bagcache
     )
     scores = make_score_tree(
         doctrees[doctree],
@@ -5,6 +5,12 @@ except ImportError:
 
 from enum import Enum
 import re
+import sys
+import json
+import mmap
+import struct
+from array import array
+from xml.parsers import expat
 from itertools import chain
 
 id_classification = Enum('id_classification', 'org rel com none')
@@ -23,7 +29,19 @@ Examples:
  - 'Q4_R8_C154' matches the groups ('Q4', 'R8', 'C154')
  - 'R8'         does not match
 """
-ID_EXTRACTION_REGEX = r'(Q[0-9]+)(?:_(R[0-9]+)(?:_(C[0-9]))?)?'
+ID_EXTRACTION_REGEX = r'(Q[0-9]+)(?:_(R[0-9]+)(?:_(C[0-9]+))?)?'
+ID_EXTRACTION_PATTERN = re.compile(ID_EXTRACTION_REGEX)
+
+"""Packed ids store the original, related and comment numbers of an id in fields of ID_FIELD_BITS bits, from the most to the least significant.
+A missing fragment is stored as 0, so that packed ids sort like the natural sort of their string form.
+
+Examples:
+ - 'Q4'         is packed as (4 << 40)
+ - 'Q4_R8'      is packed as (4 << 40) | (8 << 20)
+ - 'Q4_R8_C154' is packed as (4 << 40) | (8 << 20) | 154
+"""
+ID_FIELD_BITS = 20
+ID_FIELD_MASK = (1 << ID_FIELD_BITS) - 1
 
 ##################################
 # helper functions to xmlextract #
@@ -48,7 +66,7 @@ def classify_id(identifier):
          - the rel fragment (ex _R4), and
          - the comment fragment (ex _C2).
     """
-    match = re.match(ID_EXTRACTION_REGEX, identifier)
+    match = ID_EXTRACTION_PATTERN.match(identifier)
     if match:
         result = match.groups()
         group_number = 0
@@ -67,9 +85,105 @@ def classify_id(identifier):
     return (id_classification.none,)
 
 
+def pack_semeval_id(identifier):
+    """Encode an id as an integer.
+
+    Parameters
+    ----------
+    identifier : str
+        The identifier to encode (ex Q268_R4_C2).
+
+    Returns
+    -------
+    out : int
+        The packed identifier.
+
+    Raises
+    ------
+    ValueError
+        If the identifier is not a semeval id, if one of its numbers does
+        not fit in ID_FIELD_BITS bits, or if its rel or comment number is 0
+        (it would pack like the id without that fragment).
+    """
+    match = ID_EXTRACTION_PATTERN.match(identifier)
+    if match is None:
+        raise ValueError('not a semeval id: ' + identifier)
+    org, rel, com = (int(fragment[1:]) if fragment is not None else None
+                     for fragment in match.groups())
+    if org > ID_FIELD_MASK or any(number is not None and not 0 < number <= ID_FIELD_MASK
+                                  for number in (rel, com)):
+        raise ValueError('semeval id out of the packable range: ' + identifier)
+    rel = rel or 0
+    com = com or 0
+    return (org << 2 * ID_FIELD_BITS) | (rel << ID_FIELD_BITS) | com
+
+
+def unpack_semeval_id(packed):
+    """Decode a packed id back to its string form.
+
+    Parameters
+    ----------
+    packed : int
+        The packed identifier, as returned by pack_semeval_id.
+
+    Returns
+    -------
+    out : str
+        The identifier (ex Q268_R4_C2).
+    """
+    rel = (packed >> ID_FIELD_BITS) & ID_FIELD_MASK
+    com = packed & ID_FIELD_MASK
+    identifier = 'Q' + str(packed >> 2 * ID_FIELD_BITS)
+    if rel:
+        identifier += '_R' + str(rel)
+    if com:
+        identifier += '_C' + str(com)
+    return identifier
+
+
+def classify_packed_id(packed):
+    """Gives the classification of a packed id, without going through its string form.
+
+    Parameters
+    ----------
+    packed : int
+        The packed identifier to classify.
+
+    Returns
+    -------
+    out : id_classification
+        The classification of the identifier.
+    """
+    if packed & ID_FIELD_MASK:
+        return id_classification.com
+    if (packed >> ID_FIELD_BITS) & ID_FIELD_MASK:
+        return id_classification.rel
+    return id_classification.org
+
+
 ##############################
 # semeval element retrievers #
 ##############################
+def get_child_text(element, tag):
+    """Retrieve the text of the first child of an element having a given tag.
+
+    Parameters
+    ----------
+    element : ET.Element
+        The parent element.
+
+    tag : str
+        The tag of the child.
+
+    Returns
+    -------
+    out : str
+        The text of the child, an empty string if it has none.
+    """
+    text = element.find(tag).text
+    return text if text is not None else ''
+
+
 def get_orgquestion_content(orgquestion):
     """Retrieve the content of an original question element.
 
@@ -86,10 +200,7 @@ def get_orgquestion_content(orgquestion):
         The textual content of the original question.
     """
     return '. '.join(
-        [orgquestion.find(tag).text
-         if orgquestion.find(tag).text is not None else ''
-         for tag in ['OrgQSubject', 'OrgQBody']
-         ]
+        [get_child_text(orgquestion, tag) for tag in ['OrgQSubject', 'OrgQBody']]
     )
 
 
@@ -109,10 +220,7 @@ def get_relquestion_content(relquestion):
         The textual content of the related question.
     """
     return '. '.join(
-        [relquestion.find(tag).text
-         if relquestion.find(tag).text is not None else ''
-         for tag in ['RelQSubject', 'RelQBody']
-         ]
+        [get_child_text(relquestion, tag) for tag in ['RelQSubject', 'RelQBody']]
     )
 
 
@@ -149,6 +257,9 @@ def get_semeval_content(element):
     out : str
         The text of the element.
     """
+    if isinstance(element, corpus_element):
+        return element.get_content()
+
     if element.tag == 'OrgQuestion':
         return get_orgquestion_content(element)
 
@@ -183,6 +294,9 @@ def get_semeval_content_with_relcomments(element):
     out : str
         The text of the element.
     """
+    if isinstance(element, corpus_element):
+        return element.get_content_with_relcomments()
+
     if element.tag == 'OrgQuestion':
         return get_orgquestion_content(element)
 
@@ -199,7 +313,79 @@ def get_semeval_content_with_relcomments(element):
     return None
 
 
-def get_semeval_id(element):
+def iter_semeval_segments(element, max_comments=None, max_chars=None):
+    """Stream the content of a semeval element as segments, related comments included.
+
+    A thread yields the content of its related question followed by the content of each of its comments, an original question or a related comment only yields its own content.
+    The number of segments is bounded, which keeps the cost of annotating very long threads under control.
+
+    Parameters
+    ----------
+    element : ET.Element
+        The original question, thread or related comment to get the text from.
+
+    max_comments : int
+        The maximum number of comments to yield, all of them if None.
+
+    max_chars : int
+        The maximum number of characters to yield, over all the segments.
+        The first segment is truncated to fit, whereas the comments that do not fit are left out.
+
+    Returns
+    -------
+    out : generator of str
+        The segments of the element.
+    """
+    first = get_semeval_content(element)
+    if first is None:
+        return
+    if max_chars is not None:
+        first = first[:max_chars]
+    yield first
+
+    budget = None if max_chars is None else max_chars - len(first)
+    comments = get_related_comments(element) if element.tag == 'Thread' else []
+    if max_comments is not None:
+        comments = comments[:max_comments]
+    for comment in comments:
+        text = get_semeval_content(comment)
+        if not text:
+            continue
+        if budget is not None:
+            if len(text) > budget:
+                return
+            budget -= len(text)
+        yield text
+
+
+def get_semeval_content_with_relcomments_bounded(element, max_comments=None, max_chars=None):
+    """Retrieve the content of a semeval element, a bounded number of related comments included.
+
+    This is a size-bounded variant of get_semeval_content_with_relcomments, see iter_semeval_segments for the meaning of the bounds.
+    functools.partial can be used to fix the bounds and get a content extractor.
+
+    Parameters
+    ----------
+    element : ET.Element
+        The original question, thread or related comment to get the text from.
+
+    max_comments : int
+        The maximum number of comments to include, all of them if None.
+
+    max_chars : int
+        The maximum number of characters to include, separators excluded.
+
+    Returns
+    -------
+    out : str
+        The text of the element.
+    """
+    if element.tag == 'RelQuestion':
+        return None
+    return ' '.join(iter_semeval_segments(element, max_comments, max_chars))
+
+
+def get_semeval_id(element, packed=False):
     """Retrieve the id of a semeval element.
 
     Parameters
@@ -208,10 +394,13 @@ def get_semeval_id(element):
     element : ET.Element
         The original question, related question or related comment from which to extract the id.
 
+    packed : boolean
+        Whether to return the id packed as an integer (see pack_semeval_id).
+
     Returns
     -------
 
-    out : str
+    out : str or int
         The id of the element.
     """
     translation = {'OrgQuestion': 'ORGQ_ID',
@@ -220,7 +409,8 @@ def get_semeval_id(element):
                    'Thread': 'THREAD_SEQUENCE'}
 
     if element.tag in translation.keys():
-        return element.attrib[translation[element.tag]]
+        identifier = element.attrib[translation[element.tag]]
+        return pack_semeval_id(identifier) if packed else identifier
     return None
 
 
@@ -279,6 +469,9 @@ def get_related_questions(element):
     -------
     out : list of ET.element
     """
+    if isinstance(element, (corpus_element, corpusextract)):
+        return element.get_related_questions()
+
     tag2path = {
         'OrgQuestion': './Thread/RelQuestion',
         'Thread': './RelQuestion',
@@ -306,6 +499,9 @@ def get_related_threads(element):
     -------
     out : list of ET.element
     """
+    if isinstance(element, (corpus_element, corpusextract)):
+        return element.get_related_threads()
+
     tag2path = {
         'OrgQuestion': './Thread',
         'Thread': '.',
@@ -315,6 +511,144 @@ def get_related_threads(element):
     return element.findall('./OrgQuestion/Thread')
 
 
+TEXT_TAGS = {'OrgQSubject', 'OrgQBody', 'RelQSubject', 'RelQBody', 'RelCText'}
+
+def get_related_comments(element):
+    """Retrieve the related comments from an element.
+
+    This element can be:
+     - original question
+     - thread
+     - related comment (returns itself)
+
+    Parameters
+    ----------
+    element : ET.element
+        The element from wich to extract the related comments.
+
+    Returns
+    -------
+    out : list of ET.element
+    """
+    if isinstance(element, corpus_element):
+        return element.get_related_comments()
+
+    tag2path = {
+        'OrgQuestion': './Thread/RelComment',
+        'Thread': './RelComment',
+        'RelComment': '.',
+    }
+    if element.tag in tag2path:
+        return element.findall(tag2path[element.tag])
+    return []
+
+
+def iter_element_texts(element):
+    """Stream the textual contents found under an element, in document order.
+
+    This includes the original subjects and bodies, the related subjects and bodies, and the related comments.
+
+    Parameters
+    ----------
+    element : ET.Element
+        The element from which to extract the texts.
+
+    Returns
+    -------
+    out : generator of str
+        The textual contents, empty strings standing for empty elements.
+    """
+    for descendant in element.iter():
+        if descendant.tag in TEXT_TAGS:
+            yield descendant.text if descendant.text is not None else ''
+
+
+def iterparse_org_questions(xml_filename):
+    """Stream the original questions of a semeval xml file, one merged group at a time.
+
+    Contrary to xmlextract, the whole document is never held in memory: each original question is yielded with all of its threads and comments as soon as the next original question starts, after which it is detached from the document.
+    Consecutive original questions sharing the same ID are merged the same way as in xmlextract.merge_original_questions, which is enough for the semeval files since they repeat an original question once per thread, one after the other.
+
+    Parameters
+    ----------
+    xml_filename : str
+        The name of the source file.
+
+    Returns
+    -------
+    out : generator of ET.Element
+        The merged original questions, in document order.
+    """
+    context = ET.iterparse(xml_filename, events=('start', 'end'))
+    _, root = next(context)
+    pending = None
+
+    for event, element in context:
+        if event != 'end' or element.tag != 'OrgQuestion':
+            continue
+
+        root.remove(element)  # the root only ever holds the current original question
+        element.tail = None
+        if pending is not None and \
+           pending.attrib['ORGQ_ID'] == element.attrib['ORGQ_ID']:
+            pending.extend(element.findall('./Thread'))
+        else:
+            if pending is not None:
+                yield pending
+            pending = element
+
+    if pending is not None:
+        yield pending
+
+
+def scan_relevancy(xml_filename):
+    """Read the relevance of the related questions of a semeval xml file, without building any element.
+
+    Only the attributes of the RelQuestion start tags are looked at, the texts are neither kept nor merged.
+
+    Parameters
+    ----------
+    xml_filename : str
+        The name of the source file.
+
+    Returns
+    -------
+    out : dict of boolean
+        Associates the related questions' IDs to their boolean relevance.
+    """
+    result = {}
+
+    def start_element(tag, attributes):
+        if tag == 'RelQuestion':
+            result[attributes['RELQ_ID']] = \
+                attributes['RELQ_RELEVANCE2ORGQ'] in RELEVANT_TAGS
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = start_element
+    with open(xml_filename, 'rb') as source:
+        parser.ParseFile(source)
+    return result
+
+
+def iterparse_all_text(xml_filename):
+    """Stream all the textual contents of a semeval xml file, in document order.
+
+    This is the streaming counterpart of xmlextract.get_all_text, only one original question being held in memory at any time.
+
+    Parameters
+    ----------
+    xml_filename : str
+        The name of the source file.
+
+    Returns
+    -------
+    out : generator of str
+        The textual contents.
+    """
+    for org in iterparse_org_questions(xml_filename):
+        yield from iter_element_texts(org)
+
+
 class xmlextract(object):
     """Open an xml from semeval and allow to easily extract informations from it.
 
@@ -386,16 +720,50 @@ class xmlextract(object):
         """
         self.merged_tree = ET.ElementTree()
         self.merged_root = self.root
-        ids_encountered = set()
-        for org_question in self.merged_root.findall('./OrgQuestion'):
-            org_id = org_question.attrib['ORGQ_ID']
-            if org_id not in ids_encountered:
-                current_subtree = org_question  # works because assignment has reference semantics
-                ids_encountered.add(org_id)
+        first_occurrences = {}
+        children = []
+        for child in self.merged_root:
+            if child.tag != 'OrgQuestion':
+                children.append(child)
+                continue
+
+            org_id = child.attrib['ORGQ_ID']
+            if org_id not in first_occurrences:
+                first_occurrences[org_id] = child  # works because assignment has reference semantics
+                children.append(child)
             else:
-                current_subtree.append(org_question.find('./Thread'))
-                self.root.remove(org_question)
+                first_occurrences[org_id].extend(child.findall('./Thread'))
+
+        # rebuilding the children at once avoids a linear removal per duplicate
+        self.merged_root[:] = children
         self.merged_tree._setroot(self.merged_root)
+        self.indexes = None
+        self.text_table = None
+
+    def build_indexes(self):
+        """Index the elements of the merged tree by their IDs.
+
+        The indexes are built lazily on the first ID lookup, and associate:
+         - ORGQ_ID to original questions,
+         - THREAD_SEQUENCE to related threads,
+         - RELQ_ID to related questions,
+         - RELC_ID to related comments.
+
+        Returns
+        -------
+        out : dict of dict of ET.Element
+            The indexes, accessible with the tags of the elements they index.
+        """
+        if self.indexes is None:
+            self.indexes = {tag: {} for tag in
+                            ['OrgQuestion', 'Thread', 'RelQuestion', 'RelComment']}
+            for org_question in self.merged_root.iter('OrgQuestion'):
+                self.indexes['OrgQuestion'].setdefault(
+                    org_question.attrib['ORGQ_ID'], org_question)
+            for tag in ['Thread', 'RelQuestion', 'RelComment']:
+                for element in self.merged_root.iter(tag):
+                    self.indexes[tag].setdefault(get_semeval_id(element), element)
+        return self.indexes
 
     def get_org_questions_ids(self):
         """Retrieve the original questions' IDs.
@@ -444,10 +812,7 @@ class xmlextract(object):
         out : ET.Element
             The original question element if found, None otherwise.
         """
-        for question in self.merged_root.iter('OrgQuestion'):
-            if question.attrib['ORGQ_ID'] == org_id:
-                return question
-        return None
+        return self.build_indexes()['OrgQuestion'].get(org_id)
 
     def get_rel_thread(self, org_id, rel_id):
         """Retrieve a related thread using its original ID and its related ID.
@@ -465,10 +830,7 @@ class xmlextract(object):
         out : ET.Element
             The related thread element if found, None otherwise.
         """
-        for thread in self.get_org_question(org_id).iter('Thread'):
-            if thread.attrib['THREAD_SEQUENCE'] == org_id + "_" + rel_id:
-                return thread
-        return None
+        return self.build_indexes()['Thread'].get(org_id + '_' + rel_id)
 
     def get_rel_question(self, org_id, rel_id):
         """Retrieve a related question using its original ID and its related ID.
@@ -486,7 +848,7 @@ class xmlextract(object):
         out : ET.Element
             The related question element if found, None otherwise.
         """
-        return self.get_rel_thread(org_id, rel_id).find('./RelQuestion')
+        return self.build_indexes()['RelQuestion'].get(org_id + '_' + rel_id)
 
     def get_rel_comment(self, org_id, rel_id, com_id):
         """Retrieve a related comment using its original ID, its related ID and its comment ID.
@@ -507,10 +869,8 @@ class xmlextract(object):
         out : ET.Element
             The related comment element if found, None otherwise.
         """
-        for comment in self.get_rel_thread(org_id, rel_id).iter('RelComment'):
-            if comment.attrib['RELC_ID'] == org_id + '_' + rel_id + '_' + com_id:
-                return comment
-        return None
+        return self.build_indexes()['RelComment'].get(
+            org_id + '_' + rel_id + '_' + com_id)
 
     #################################
     # retrieve any element from ids #
@@ -539,6 +899,21 @@ class xmlextract(object):
             return self.get_rel_comment(org, rel, com)
         return None
 
+    def get_elements_from_ids(self, identifiers):
+        """Retrieve several elements from their IDs.
+
+        Parameters
+        ----------
+        identifiers : iterable of str
+            IDs of the elements (corresponding to ORGQ_IDs, RELQ_IDs or RELC_IDs).
+
+        Returns
+        -------
+        out : list of ET.Element
+            The asked-for elements, None standing for the ones that were not found.
+        """
+        return [self.get_element_from_id(identifier) for identifier in identifiers]
+
     ###########################
     # extracting path from id #
     ###########################
@@ -558,12 +933,9 @@ class xmlextract(object):
         out : list of ET.Element
             The list of elements matching the path and the original question ID.
         """
-        for org_question in self.merged_root.iter('OrgQuestion'):
-            if org_question.attrib['ORGQ_ID'] == org_id:
-                extraction = org_question.findall(path)
-                if len(extraction) != 0:
-                    return extraction
-
+        org_question = self.get_org_question(org_id)
+        if org_question is not None:
+            return org_question.findall(path)
         return list()
 
     def find_path_from_org_id(self, path, org_id):
@@ -582,12 +954,9 @@ class xmlextract(object):
         out : ET.Element
             The first element matching the path and the original question ID.
         """
-        for org_question in self.merged_root.iter('OrgQuestion'):
-            if org_question.attrib['ORGQ_ID'] == org_id:
-                extraction = org_question.find(path)
-                if extraction is not None:
-                    return extraction  # only returns if a path was found
-
+        org_question = self.get_org_question(org_id)
+        if org_question is not None:
+            return org_question.find(path)
         return None
 
     ###################
@@ -620,3 +989,468 @@ class xmlextract(object):
             ])  # extract text from each element matching the path
 
         return result
+
+    def iter_all_text(self):
+        """Stream all the textual contents from the source file, in document order.
+
+        The texts are the same as those of get_all_text, without building the list.
+
+        Returns
+        -------
+        out : generator of str
+            The textual contents.
+        """
+        return iter_element_texts(self.merged_root)
+
+    def get_text_table(self):
+        """Retrieve the content of every original question, related question and related comment.
+
+        The table is built lazily, in a single pass over the merged tree, with the same joining semantics as get_semeval_content.
+
+        Returns
+        -------
+        out : dict of str
+            Associates the IDs (ORGQ_ID, THREAD_SEQUENCE, RELQ_ID and RELC_ID) to the textual contents.
+        """
+        if self.text_table is None:
+            getters = {'OrgQuestion': get_orgquestion_content,
+                       'RelQuestion': get_relquestion_content,
+                       'RelComment': get_relcomment_content}
+            self.text_table = {
+                get_semeval_id(element): getters[element.tag](element)
+                for element in self.merged_root.iter()
+                if element.tag in getters
+            }
+            for thread in self.merged_root.iter('Thread'):  # usually shares its ID with its question
+                self.text_table.setdefault(
+                    get_semeval_id(thread),
+                    self.text_table[get_semeval_id(thread.find('./RelQuestion'))])
+        return self.text_table
+
+    def get_semeval_content(self, element):
+        """Retrieve the content of a semeval element from the text table.
+
+        This method can be used instead of the get_semeval_content function, for example as a content extractor for an element of this extractor.
+
+        Parameters
+        ----------
+        element : ET.Element
+            The original question, related question, thread or related comment to get the text from.
+
+        Returns
+        -------
+        out : str
+            The text of the element.
+        """
+        return self.get_text_table().get(get_semeval_id(element))
+
+    def get_semeval_content_with_relcomments(self, element):
+        """Retrieve the content of a semeval element from the text table, related comment included.
+
+        This method can be used instead of the get_semeval_content_with_relcomments function.
+
+        Parameters
+        ----------
+        element : ET.Element
+            The original question, thread or related comment to get the text from.
+
+        Returns
+        -------
+        out : str
+            The text of the element.
+        """
+        if element.tag == 'Thread':
+            table = self.get_text_table()
+            return ' '.join(chain(
+                [self.get_semeval_content(element)],
+                [table[get_semeval_id(comment)]
+                 for comment in element.findall('./RelComment')]
+            ))
+        if element.tag == 'RelQuestion':
+            return None
+        return self.get_semeval_content(element)
+
+
+#####################
+# compiled corpuses #
+#####################
+"""A compiled corpus holds the content of a semeval xml file in a compact binary form that can be memory-mapped.
+
+Each original question, related thread and related comment is stored as a record, in document order, each record being immediately followed by its descendants.
+The file is made of:
+ - the magic bytes CORPUS_MAGIC,
+ - the length of the header, as a little-endian unsigned 64 bits integer,
+ - the header, a json object describing the sections,
+ - the sections, aligned on CORPUS_ALIGNMENT bytes.
+
+The sections are:
+ - kind: the kind of each record (CORPUS_KINDS),
+ - end: the index following the last descendant of each record,
+ - relevance: the index of the relevance label of each record (labels are stored in the header),
+ - strings: the offsets in the blob of three strings per record (id, subject or comment text, body),
+ - id_order: the records sorted by id, to find them by binary search,
+ - blob: the utf-8 encoded strings.
+"""
+CORPUS_MAGIC = b'SEMCORP1'
+CORPUS_ALIGNMENT = 8
+CORPUS_KINDS = ['OrgQuestion', 'Thread', 'RelComment']
+CORPUS_STRINGS_PER_RECORD = 3
+
+
+def compile_semeval_corpus(xml_filename, corpus_filename):
+    """Compile a semeval xml file into a corpus that can be opened by corpusextract.
+
+    The xml file is read with iterparse_org_questions, and the original questions sharing the same ID are grouped, even when they are not contiguous, the same way as in xmlextract.merge_original_questions.
+
+    Parameters
+    ----------
+    xml_filename : str
+        The name of the source file.
+
+    corpus_filename : str
+        The name of the compiled corpus to write.
+    """
+    kinds = array('B')
+    ends = array('Q')
+    relevances = array('B')
+    offsets = array('Q', [0])
+    blob = bytearray()
+    labels = ['']  # original questions have no relevance
+
+    def add_record(kind, relevance, *strings):
+        if relevance not in labels:
+            labels.append(relevance)
+        kinds.append(CORPUS_KINDS.index(kind))
+        ends.append(0)
+        relevances.append(labels.index(relevance))
+        for string in strings:
+            blob.extend((string or '').encode('utf-8'))
+            offsets.append(len(blob))
+        return len(kinds) - 1
+
+    def close_record(index):
+        ends[index] = len(kinds)
+
+    # the records of an original question must be contiguous, so they are grouped by ID before being written
+    orgs = {}
+    for org in iterparse_org_questions(xml_filename):
+        identifier = get_semeval_id(org)
+        if identifier not in orgs:
+            orgs[identifier] = (org.find('OrgQSubject').text, org.find('OrgQBody').text, [])
+        threads = orgs[identifier][2]
+        for thread in get_related_threads(org):
+            relquestion = thread.find('./RelQuestion')
+            threads.append((
+                get_semeval_relevance_orgq(relquestion), get_semeval_id(thread),
+                relquestion.find('RelQSubject').text, relquestion.find('RelQBody').text,
+                [(get_semeval_relevance_orgq(comment), get_semeval_id(comment),
+                  get_relcomment_content(comment))
+                 for comment in thread.findall('./RelComment')]))
+
+    for identifier, (subject, body, threads) in orgs.items():
+        org_index = add_record('OrgQuestion', '', identifier, subject, body)
+        for relevance, thread_id, relsubject, relbody, comments in threads:
+            thread_index = add_record('Thread', relevance, thread_id, relsubject, relbody)
+            for comment_relevance, comment_id, content in comments:
+                close_record(add_record('RelComment', comment_relevance, comment_id, content, ''))
+            close_record(thread_index)
+        close_record(org_index)
+
+    def record_id(index):
+        start = offsets[index * CORPUS_STRINGS_PER_RECORD]
+        return bytes(blob[start:offsets[index * CORPUS_STRINGS_PER_RECORD + 1]])
+    id_order = array('Q', sorted(range(len(kinds)), key=record_id))
+
+    sections = [('kind', kinds), ('end', ends), ('relevance', relevances),
+                ('strings', offsets), ('id_order', id_order), ('blob', bytes(blob))]
+
+    header = {'byteorder': sys.byteorder, 'records': len(kinds),
+              'labels': labels, 'sections': {}}
+    position = 0
+    for name, section in sections:
+        typecode = section.typecode if isinstance(section, array) else 'B'
+        length = len(section) * (section.itemsize if isinstance(section, array) else 1)
+        header['sections'][name] = [position, length, typecode]
+        position += length + (-length % CORPUS_ALIGNMENT)
+
+    encoded_header = json.dumps(header).encode('utf-8')
+    prefix_length = len(CORPUS_MAGIC) + 8 + len(encoded_header)
+    encoded_header += b' ' * (-prefix_length % CORPUS_ALIGNMENT)
+
+    with open(corpus_filename, 'wb') as out:
+        out.write(CORPUS_MAGIC)
+        out.write(struct.pack('<Q', len(encoded_header)))
+        out.write(encoded_header)
+        for name, section in sections:
+            data = section.tobytes() if isinstance(section, array) else section
+            out.write(data)
+            out.write(b'\0' * (-len(data) % CORPUS_ALIGNMENT))
+
+
+class corpus_element(object):
+    """Lightweight stand-in for the elements of a compiled corpus.
+
+    It exposes the tag and the attributes an ET.Element would have, so that get_semeval_id, get_semeval_relevance_orgq and is_relevant_to_orgq work unchanged, whereas the content and the related elements are fetched from the corpus.
+    """
+    __slots__ = ('corpus', 'index', 'tag')
+
+    def __init__(self, corpus, index, tag):
+        self.corpus = corpus
+        self.index = index
+        self.tag = tag
+
+    @property
+    def attrib(self):
+        identifier = self.corpus.get_string(self.index, 0)
+        relevance = self.corpus.get_relevance(self.index)
+        if self.tag == 'OrgQuestion':
+            return {'ORGQ_ID': identifier}
+        if self.tag == 'Thread':
+            return {'THREAD_SEQUENCE': identifier}
+        if self.tag == 'RelQuestion':
+            return {'RELQ_ID': identifier, 'RELQ_RELEVANCE2ORGQ': relevance}
+        return {'RELC_ID': identifier, 'RELC_RELEVANCE2ORGQ': relevance}
+
+    def get_content(self):
+        if self.tag == 'RelComment':
+            return self.corpus.get_string(self.index, 1)
+        return '. '.join([self.corpus.get_string(self.index, 1),
+                          self.corpus.get_string(self.index, 2)])
+
+    def get_content_with_relcomments(self):
+        if self.tag == 'RelQuestion':
+            return None
+        if self.tag != 'Thread':
+            return self.get_content()
+        return ' '.join(chain(
+            [self.get_content()],
+            [self.corpus.get_string(comment, 1)
+             for comment in self.corpus.get_children(self.index)]
+        ))
+
+    def get_related_threads(self):
+        if self.tag == 'OrgQuestion':
+            return [corpus_element(self.corpus, thread, 'Thread')
+                    for thread in self.corpus.get_children(self.index)]
+        if self.tag == 'Thread':
+            return [self]
+        return []
+
+    def get_related_comments(self):
+        if self.tag == 'RelComment':
+            return [self]
+        return [corpus_element(self.corpus, comment, 'RelComment')
+                for thread in self.get_related_threads()
+                for comment in self.corpus.get_children(thread.index)]
+
+    def get_related_questions(self):
+        if self.tag == 'RelQuestion':
+            return [self]
+        return [corpus_element(self.corpus, thread.index, 'RelQuestion')
+                for thread in self.get_related_threads()]
+
+
+class corpusextract(object):
+    """Open a compiled corpus and allow to easily extract informations from it.
+
+    The corpus is memory-mapped, so opening it does not parse anything and the pages are shared between the processes using the same file.
+    The methods mirror those of xmlextract, but return corpus_element objects instead of ET.Element objects.
+    """
+
+    def __init__(self, corpus_filename):
+        """Initialize the extractor.
+
+        Parameters
+        ----------
+        corpus_filename : str
+            The name of the compiled corpus, as written by compile_semeval_corpus.
+        """
+        self.source = corpus_filename
+        with open(corpus_filename, 'rb') as corpus_file:
+            self.map = mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.map[:len(CORPUS_MAGIC)] != CORPUS_MAGIC:
+            raise ValueError(corpus_filename + ' is not a compiled corpus')
+        header_start = len(CORPUS_MAGIC) + 8
+        header_length, = struct.unpack('<Q', self.map[len(CORPUS_MAGIC):header_start])
+        header = json.loads(self.map[header_start:header_start + header_length].decode('utf-8'))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(corpus_filename + ' was compiled with another byte order')
+
+        self.records = header['records']
+        self.labels = header['labels']
+        view = memoryview(self.map)
+        data_start = header_start + header_length
+        self.sections = {}
+        for name, (position, length, typecode) in header['sections'].items():
+            start = data_start + position
+            self.sections[name] = view[start:start + length].cast(typecode)
+        self.blob_start = data_start + header['sections']['blob'][0]
+
+    #######################
+    # low-level accessors #
+    #######################
+    def get_string(self, index, field):
+        """Decode one of the strings of a record.
+
+        Parameters
+        ----------
+        index : int
+            The index of the record.
+
+        field : int
+            0 for the id, 1 for the subject or the comment text, 2 for the body.
+
+        Returns
+        -------
+        out : str
+            The decoded string.
+        """
+        offsets = self.sections['strings']
+        position = index * CORPUS_STRINGS_PER_RECORD + field
+        return self.map[self.blob_start + offsets[position]:
+                        self.blob_start + offsets[position + 1]].decode('utf-8')
+
+    def get_relevance(self, index):
+        """Retrieve the relevance label of a record ('' for original questions)."""
+        return self.labels[self.sections['relevance'][index]]
+
+    def get_children(self, index):
+        """Retrieve the indexes of the direct children of a record.
+
+        Parameters
+        ----------
+        index : int
+            The index of the record, or -1 to get the original questions.
+
+        Returns
+        -------
+        out : generator of int
+        """
+        ends = self.sections['end']
+        child = index + 1
+        end = ends[index] if index >= 0 else self.records
+        while child < end:
+            yield child
+            child = ends[child]
+
+    def find_record(self, identifier):
+        """Find the index of a record from its id, by binary search.
+
+        Returns
+        -------
+        out : int
+            The index of the record, None if it was not found.
+        """
+        key = identifier.encode('utf-8')
+        order = self.sections['id_order']
+        offsets = self.sections['strings']
+        low, high = 0, self.records
+        while low < high:
+            middle = (low + high) // 2
+            position = order[middle] * CORPUS_STRINGS_PER_RECORD
+            candidate = self.map[self.blob_start + offsets[position]:
+                                 self.blob_start + offsets[position + 1]]
+            if candidate < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.records and self.get_string(order[low], 0) == identifier:
+            return order[low]
+        return None
+
+    def get_org_questions_ids(self):
+        """Retrieve the original questions' IDs.
+
+        Returns
+        -------
+        out : list of str
+            The list of the original questions IDs.
+        """
+        return [self.get_string(org, 0) for org in self.get_children(-1)]
+
+    #######################
+    # elements extraction #
+    #######################
+    def get_org_elements(self):
+        """Retrieve the elements of the original questions.
+
+        Returns
+        -------
+        out : list of corpus_element
+        """
+        return [corpus_element(self, org, 'OrgQuestion') for org in self.get_children(-1)]
+
+    def get_rel_elements(self):
+        """Retrieve the elements of the related questions.
+
+        Returns
+        -------
+        out : list of corpus_element
+        """
+        return self.get_related_questions()
+
+    def get_related_threads(self):
+        return [thread for org in self.get_org_elements()
+                for thread in org.get_related_threads()]
+
+    def get_related_questions(self):
+        return [question for org in self.get_org_elements()
+                for question in org.get_related_questions()]
+
+    #################################
+    # retrieve any element from ids #
+    #################################
+    def get_element_from_id(self, identifier):
+        """Retrieve an element from its ID.
+
+        Parameters
+        ----------
+        identifier : str
+            ID of the element (corresponding to an ORGQ_ID, RELQ_ID or RELC_ID).
+
+        Returns
+        -------
+        out : corpus_element
+            The asked-for element if it was found, None otherwise.
+        """
+        index = self.find_record(identifier)
+        if index is None:
+            return None
+        tag = CORPUS_KINDS[self.sections['kind'][index]]
+        return corpus_element(self, index, 'RelQuestion' if tag == 'Thread' else tag)
+
+    def get_elements_from_ids(self, identifiers):
+        """Retrieve several elements from their IDs.
+
+        Parameters
+        ----------
+        identifiers : iterable of str
+            IDs of the elements (corresponding to ORGQ_IDs, RELQ_IDs or RELC_IDs).
+
+        Returns
+        -------
+        out : list of corpus_element
+            The asked-for elements, None standing for the ones that were not found.
+        """
+        return [self.get_element_from_id(identifier) for identifier in identifiers]
+
+    ##############
+    # relevances #
+    ##############
+    def relevancy_dict(self):
+        """Associate the related questions' IDs to their boolean relevance.
+
+        Returns
+        -------
+        out : dict of boolean
+        """
+        kinds = self.sections['kind']
+        thread_kind = CORPUS_KINDS.index('Thread')
+        relevant = [label in RELEVANT_TAGS for label in self.labels]
+        relevances = self.sections['relevance']
+        return {
+            self.get_string(index, 0): relevant[relevances[index]]
+            for index in range(self.records)
+            if kinds[index] == thread_kind
+        }
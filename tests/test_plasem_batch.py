@@ -0,0 +1,129 @@
+import os
+
+import pytest
+import spacy
+from spacy.language import Language
+
+from plasem_taln import scorer, tf_idf_scorer, interned_tf_idf_scorer, vocabulary, bag_cache
+from plasem_taln import inverse_document_frequencies
+from plasem_batch import make_batch_scorer_tree
+from plasem_semeval import make_semeval_document_tree
+from semeval_xml import iterparse_org_questions, get_semeval_content
+
+DEBUG_XML = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'debug.xml')
+
+
+@Language.component('lowercase_lemmatizer')
+def lowercase_lemmatizer(doc):
+    # stands for the lemmatizer of a trained model
+    for tok in doc:
+        tok.lemma_ = tok.lower_
+    return doc
+
+
+def make_score_tree(document_tree, score):
+    return {orgid: {relid: score(orgqnode['org'], doc)
+                    for relid, doc in orgqnode.items() if relid != 'org'}
+            for orgid, orgqnode in document_tree.items()}
+
+
+# the extractors of semeval_executable.py
+def extracttext(tok):
+    return tok.text
+
+def extractlemma(tok):
+    return tok.lemma_
+
+def extractlabel(ent):
+    return ent.label_ if hasattr(ent, 'label_') else None
+
+def getentities(doc):
+    return doc.ents or list()
+
+wordextractors = {
+    'text': extracttext,
+    'lemma': extractlemma,
+    'label': extractlabel,
+}
+
+sentenceextractors = {
+    'entities': getentities,
+    'document': lambda x: x,
+}
+
+filters = {
+    'nofilter': lambda word: True,
+    'gtr2': lambda word: len(word) > 2,
+    'nostopwords': lambda word: word.lower() not in {'the', 'a', 'in', 'to', 'and', 'of', 'i'},
+}
+
+
+@pytest.fixture(scope='module')
+def document_tree():
+    model = spacy.blank('en')
+    model.add_pipe('lowercase_lemmatizer')
+    ruler = model.add_pipe('entity_ruler')
+    ruler.add_patterns([
+        {'label': 'GPE', 'pattern': [{'LOWER': 'qatar'}]},
+        {'label': 'GPE', 'pattern': [{'LOWER': 'doha'}]},
+        {'label': 'PRODUCT', 'pattern': [{'LOWER': {'IN': ['linux', 'unix']}}]},
+        {'label': 'DATE', 'pattern': [{'LIKE_NUM': True}, {'LOWER': {'IN': ['years', 'months']}}]},
+    ])
+    tree = make_semeval_document_tree(iterparse_org_questions(DEBUG_XML), model, get_semeval_content)
+    assert any(doc.ents for orgqnode in tree.values() for doc in orgqnode.values())
+    return tree
+
+
+@pytest.mark.parametrize('wordex, sentex', [
+    ('text', 'document'),
+    ('lemma', 'document'),
+    ('text', 'entities'),
+    ('label', 'entities'),
+])
+@pytest.mark.parametrize('filterkeys', [(), ('nofilter',), ('gtr2', 'nostopwords')])
+@pytest.mark.parametrize('scorerfunction', [tf_idf_scorer, interned_tf_idf_scorer])
+def test_batch_scorer_tree_matches_scorer(document_tree, wordex, sentex, filterkeys, scorerfunction):
+    wordextractor = wordextractors[wordex]
+    sentenceextractor = sentenceextractors[sentex]
+    # half of the documents, so that some terms are out of corpus
+    inversedocfreqs = inverse_document_frequencies([
+        [wordextractor(unit) for unit in sentenceextractor(doc)]
+        for orgqnode in document_tree.values()
+        for doc in list(orgqnode.values())[::2]
+    ])
+    customscorer = scorer(
+        wordextractor,
+        sentenceextractor,
+        [filters[key] for key in filterkeys],
+        inversedocfreqs,
+        max(inversedocfreqs.values(), default=0),
+        scorerfunction,
+        vocabulary() if scorerfunction is interned_tf_idf_scorer else None,
+        wordex + '_' + sentex
+    )
+
+    expected = make_score_tree(document_tree, customscorer.get_score)
+    scores = make_batch_scorer_tree(document_tree, customscorer)
+    assert scores == expected
+    assert any(score for related in scores.values() for score in related.values())
+
+
+def test_shared_bag_cache_keeps_vocabularies_apart(document_tree):
+    inversedocfreqs = inverse_document_frequencies([
+        [extracttext(tok) for tok in doc]
+        for orgqnode in document_tree.values()
+        for doc in orgqnode.values()
+    ])
+    # the same forms get other ids in the second vocabulary
+    reversed_vocabulary = vocabulary()
+    reversed_vocabulary.encode('text_document', sorted(inversedocfreqs, reverse=True))
+
+    def make_scorer(voc, cache):
+        return scorer(extracttext, sentenceextractors['document'], [],
+                      inversedocfreqs, max(inversedocfreqs.values()),
+                      interned_tf_idf_scorer, voc, 'text_document', cache)
+
+    cache = bag_cache()
+    for voc in (vocabulary(), reversed_vocabulary):
+        expected = make_score_tree(document_tree, make_scorer(voc, None).get_score)
+        assert make_score_tree(document_tree, make_scorer(voc, cache).get_score) == expected